@@ -1,30 +1,88 @@
+import os
+import threading
 
 from .errors import *
 from .connection import Connection
+from .auth import get_credentials_provider
+from .fetch import ON_GAE
 
 
-try:
-    from google.appengine.api import app_identity
-    ON_GAE = True
-except ImportError:
-    ON_GAE = False
+apilevel = "2.0"
+
+# Threads may share the module and connections, but not cursors
+threadsafety = 2
+
+paramstyle = "qmark"
+
+# Sessions ConnectionFactory creates for each process when it starts up
+DEFAULT_WARM_SESSIONS = 4
 
 
 def connect(project_id, instance_id, database_id, credentials_json=None, debug=False):
-    if not credentials_json:
-        if ON_GAE:
-            auth_token, _ = app_identity.get_access_token(
-                'https://www.googleapis.com/auth/cloud-platform'
-            )
-        else:
-            raise RuntimeError("You must specify the path to the credentials file")
-    else:
-        from oauth2client.client import GoogleCredentials
-        credentials = GoogleCredentials.from_stream(credentials_json)
-        credentials = credentials.create_scoped('https://www.googleapis.com/auth/cloud-platform')
-        access_token_info = credentials.get_access_token()
-        auth_token = access_token_info.access_token
+    # Tokens are cached process-wide and refreshed in the background, so
+    # creating a connection doesn't need to hit the OAuth servers
+    credentials = get_credentials_provider(credentials_json, on_gae=ON_GAE)
 
     return Connection(
-        project_id, instance_id, database_id, auth_token, debug=debug
+        project_id, instance_id, database_id, None, debug=debug, credentials=credentials
     )
+
+
+class ConnectionFactory(object):
+    """
+        Returns the Connection for the current process, creating it the first time
+        it's called in each process. Create the factory before a pre-forking server
+        forks its workers and call it from each worker as it starts (e.g. from
+        gunicorn's post_fork hook). Creating the connection doesn't block,
+        warm_sessions sessions are created in the background with a single
+        batchCreate request.
+
+        Connections are safe to use after a fork anyway (see Connection._check_fork),
+        but this means a worker never touches state it inherited from its parent.
+    """
+
+    def __init__(
+        self, project_id, instance_id, database_id, credentials_json=None,
+        warm_sessions=DEFAULT_WARM_SESSIONS, **kwargs
+    ):
+        self.project_id = project_id
+        self.instance_id = instance_id
+        self.database_id = database_id
+        self.credentials_json = credentials_json
+        self.warm_sessions = warm_sessions
+
+        # Passed to Connection(), by default we don't wait for any sessions
+        kwargs.setdefault("min_sessions", 0)
+        self.connection_kwargs = kwargs
+
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def __call__(self):
+        pid = os.getpid()
+        if pid != self._pid:
+            # We've been forked, the lock may have been held by a thread which
+            # doesn't exist here and the connection belongs to the parent
+            self._pid = pid
+            self._lock = threading.Lock()
+            self._connection = None
+
+        connection = self._connection
+        if connection is None:
+            with self._lock:
+                if self._connection is None:
+                    self._connection = self._create_connection()
+                connection = self._connection
+
+        return connection
+
+    def _create_connection(self):
+        credentials = get_credentials_provider(self.credentials_json, on_gae=ON_GAE)
+        connection = Connection(
+            self.project_id, self.instance_id, self.database_id, None,
+            credentials=credentials, **self.connection_kwargs
+        )
+        if self.warm_sessions:
+            connection.warm_sessions(self.warm_sessions, wait=False)
+        return connection
@@ -0,0 +1,167 @@
+"""
+    OAuth access tokens for the Spanner API.
+
+    Tokens are cached process-wide per credentials source and scope, and are
+    refreshed in a background thread shortly before they expire so that
+    connections never have to wait for a token (except the very first time)
+    and long-lived connections don't start failing after an hour.
+"""
+
+import os
+import threading
+import time
+
+
+SPANNER_SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
+
+# How long before expiry we refresh a token in the background
+REFRESH_MARGIN = 300
+
+# Never refresh more often than this, even for very short-lived tokens
+MIN_REFRESH_INTERVAL = 30
+
+# If we can't find out when a token expires, assume this many seconds
+DEFAULT_TOKEN_LIFETIME = 3600
+
+
+def _fetch_gae_token(scope):
+    from google.appengine.api import app_identity
+    token, expires_at = app_identity.get_access_token(scope)
+    return token, expires_at
+
+
+def _gae_token_fetcher(scope):
+    return lambda: _fetch_gae_token(scope)
+
+
+def _oauth2client_token_fetcher(credentials_json, scope):
+    from oauth2client.client import GoogleCredentials
+    credentials = GoogleCredentials.from_stream(credentials_json)
+    credentials = credentials.create_scoped(scope)
+
+    def fetch():
+        info = credentials.get_access_token()
+        expires_in = info.expires_in or DEFAULT_TOKEN_LIFETIME
+        return info.access_token, time.time() + expires_in
+
+    return fetch
+
+
+class StaticCredentials(object):
+    """
+        Wraps a token that was obtained elsewhere. It can't be refreshed
+        so a 401 will just be raised to the caller.
+    """
+
+    def __init__(self, token):
+        self._token = token
+
+    def get_token(self):
+        return self._token
+
+    def refresh(self):
+        return False
+
+
+class CredentialsProvider(object):
+    """
+        Caches an access token and refreshes it in the background before it
+        expires. `fetch_token` is a callable returning (token, expiry timestamp).
+    """
+
+    def __init__(self, fetch_token, refresh_margin=REFRESH_MARGIN):
+        self._fetch_token = fetch_token
+        self._refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0
+        self._timer = None
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+
+        # The refresh timer's thread doesn't exist in a forked child, and the
+        # lock may have been held by a thread in the parent when it forked
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._timer = None
+        if self._token:
+            self._schedule_refresh()
+
+    def get_token(self):
+        self._check_fork()
+        token, expires_at = self._token, self._expires_at
+        if token and expires_at > time.time():
+            return token
+
+        with self._lock:
+            # Another thread may have fetched while we waited for the lock
+            if not self._token or self._expires_at <= time.time():
+                self._refresh_locked()
+            return self._token
+
+    def refresh(self):
+        """
+            Forces a new token to be fetched, returns True if the token
+            changed (e.g. after the API returned a 401)
+        """
+        self._check_fork()
+        with self._lock:
+            old_token = self._token
+            self._refresh_locked()
+            return self._token != old_token
+
+    def _refresh_locked(self):
+        token, expires_at = self._fetch_token()
+        self._token = token
+        self._expires_at = expires_at
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if self._timer:
+            self._timer.cancel()
+
+        delay = max(
+            self._expires_at - time.time() - self._refresh_margin,
+            MIN_REFRESH_INTERVAL
+        )
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            # get_token() will fetch synchronously if the token
+            # expires before we manage to refresh it
+            pass
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_credentials_provider(credentials_json=None, scope=SPANNER_SCOPE, on_gae=False):
+    """
+        Returns the process-wide provider for the given credentials file (or
+        App Engine's service account if there is no file) and scope.
+    """
+    key = (credentials_json, scope)
+
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            if credentials_json:
+                fetch_token = _oauth2client_token_fetcher(credentials_json, scope)
+            elif on_gae:
+                fetch_token = _gae_token_fetcher(scope)
+            else:
+                raise RuntimeError("You must specify the path to the credentials file")
+
+            provider = CredentialsProvider(fetch_token)
+            _providers[key] = provider
+
+    return provider
@@ -0,0 +1,220 @@
+"""
+    Bulk loading of rows straight into mutations, bypassing the SQL parser
+"""
+
+import sys
+import threading
+import time
+
+import six
+from six.moves import queue
+
+from .errors import BulkImportError, ProgrammingError
+from .limits import MAX_COMMIT_SIZE_BYTES, MAX_MUTATIONS_PER_COMMIT, estimate_size
+from .parser import json_converter_for_type
+
+
+DEFAULT_WORKERS = 4
+
+
+class BulkImportProgress(object):
+    def __init__(self, batches, rows, elapsed):
+        self.batches = batches
+        self.rows = rows
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return "<BulkImportProgress batches={} rows={} elapsed={:.1f}s rows/s={:.0f}>".format(
+            self.batches, self.rows, self.elapsed, self.rows_per_second
+        )
+
+
+class BulkImporter(object):
+    """
+        Splits an iterable of rows into commits of at most batch_size rows (and
+        no more than Spanner's commit size limit) and commits them from several
+        threads at once, each using its own pooled session.
+
+        Rows are written with insertOrUpdate by default so that an import can be
+        safely re-run from the last batch it knows was committed.
+    """
+
+    def __init__(
+        self, connection, table, columns, mutation="insertOrUpdate",
+        max_workers=DEFAULT_WORKERS, batch_size=None, progress=None
+    ):
+        if mutation not in ("insert", "update", "insertOrUpdate", "replace"):
+            raise ProgrammingError("Unsupported mutation type: {}".format(mutation))
+
+        self.connection = connection
+        self.table = table
+        self.columns = list(columns)
+        self.mutation = mutation
+        self.max_workers = max_workers
+        self.progress = progress
+
+        max_batch_size = MAX_MUTATIONS_PER_COMMIT // len(self.columns)
+        self.batch_size = min(batch_size or max_batch_size, max_batch_size)
+
+        # Leave room for the rest of the commit request
+        self.max_batch_bytes = MAX_COMMIT_SIZE_BYTES - 64 * 1024
+
+        self._converters = self._build_converters()
+
+        self._lock = threading.Lock()
+        self._resume_from = 0
+        self._committed = set()
+        self._rows_committed = 0
+        self._error = None
+
+    def _build_converters(self):
+        column_types = self.connection._query_column_types(self.table)
+
+        converters = []
+        for column in self.columns:
+            if column not in column_types:
+                raise ProgrammingError(
+                    "Unknown column {} in table {}".format(column, self.table)
+                )
+            converters.append(json_converter_for_type(column_types[column]))
+        return converters
+
+    def _encode_row(self, row):
+        return [
+            None if value is None else convert(value)
+            for convert, value in zip(self._converters, row)
+        ]
+
+    def _split(self, rows):
+        batch = []
+        batch_bytes = 0
+        for row in rows:
+            row = self._encode_row(row)
+            row_bytes = estimate_size(row) + 1
+
+            if batch and batch_bytes + row_bytes > self.max_batch_bytes:
+                yield batch
+                batch = []
+                batch_bytes = 0
+
+            batch.append(row)
+            batch_bytes += row_bytes
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+                batch_bytes = 0
+
+        if batch:
+            yield batch
+
+    def _batches(self, rows, resume_from):
+        # Batches aren't all the same size (large rows make for smaller batches)
+        # so the batches committed by a previous run are rebuilt, then skipped
+        for number, batch in enumerate(self._split(rows)):
+            if number >= resume_from:
+                yield number, batch
+
+    def _resume_point(self):
+        # The first batch which isn't known to be committed
+        point = 0
+        while point in self._committed:
+            point += 1
+        return point
+
+    def _commit(self, batch):
+        session = self.connection._pool.acquire()
+        try:
+            self.connection._commit_mutations(session, [{
+                self.mutation: {
+                    "table": self.table,
+                    "columns": self.columns,
+                    "values": batch
+                }
+            }])
+        finally:
+            self.connection._pool.release(session)
+
+    def _worker(self, work, start, deadline):
+        # Carry over the deadline of the thread which started the import
+        self.connection._deadline = deadline
+
+        while True:
+            item = work.get()
+            if item is None:
+                return
+
+            number, batch = item
+            if self._error:
+                continue
+
+            try:
+                self._commit(batch)
+            except Exception:
+                with self._lock:
+                    if not self._error:
+                        self._error = sys.exc_info()
+                continue
+
+            with self._lock:
+                self._committed.add(number)
+                self._rows_committed += len(batch)
+                if self.progress:
+                    self.progress(BulkImportProgress(
+                        len(self._committed) - self._resume_from,
+                        self._rows_committed,
+                        time.time() - start
+                    ))
+
+    def run(self, rows, resume_from=0):
+        """
+            Imports the rows. If a previous import failed, pass the resume_from from
+            the BulkImportError (with the same rows and batch_size) to carry on
+            where it left off.
+        """
+        start = time.time()
+
+        self._resume_from = resume_from
+        self._committed = set(range(resume_from))
+        self._rows_committed = 0
+        self._error = None
+
+        # Bounded so we don't read the whole iterable into memory
+        # if it's faster than we can commit
+        work = queue.Queue(maxsize=self.max_workers * 2)
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(work, start, self.connection._deadline)
+            )
+            for i in range(self.max_workers)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for item in self._batches(rows, resume_from):
+                if self._error:
+                    break
+                work.put(item)
+        finally:
+            for thread in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+
+        if self._error:
+            exc_type, exc_value, tb = self._error
+            error = BulkImportError(
+                "Bulk import into {} failed: {}".format(self.table, exc_value)
+            )
+            error.resume_from = self._resume_point()
+            error.rows_committed = self._rows_committed
+            six.reraise(BulkImportError, error, tb)
+
+        return BulkImportProgress(
+            len(self._committed) - resume_from, self._rows_committed, time.time() - start
+        )
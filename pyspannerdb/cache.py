@@ -0,0 +1,116 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+DEFAULT_MAX_ENTRIES = 1000
+
+# Seconds a cached result is served for
+DEFAULT_TTL = 60
+
+
+class ResultCache(object):
+    """
+        An LRU cache of SELECT results for an opted-in set of tables. A query is
+        only cached if every table it reads from is in `tables`.
+
+        Entries expire after `ttl` seconds, and are invalidated when the
+        Connection commits mutations or DDL affecting one of their tables.
+        Writes made by other processes are only picked up when entries expire.
+    """
+
+    def __init__(self, tables, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.tables = set(tables)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_table = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def cacheable(self, tables):
+        return bool(tables) and tables.issubset(self.tables)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, tables, response = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            # Move to the most recently used end
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+
+        return _copy_response(response)
+
+    def put(self, key, tables, response):
+        entry = (time.time() + self.ttl, tables, _copy_response(response))
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = entry
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tables(self, tables):
+        with self._lock:
+            for table in tables:
+                for key in list(self._keys_by_table.get(table, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def _remove(self, key):
+        expires_at, tables, response = self._entries.pop(key)
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _copy_response(response):
+    """
+        Cursors convert row values in place, so the cache never hands out
+        (or keeps) a response that somebody else holds a reference to
+    """
+    result = dict(response)
+    if "rows" in result:
+        result["rows"] = [list(row) for row in result["rows"]]
+    return result
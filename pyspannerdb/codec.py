@@ -0,0 +1,236 @@
+"""
+    JSON encoding and decoding for the Spanner REST API.
+
+    Commits with thousands of mutations and large result sets make JSON a
+    big chunk of the client's CPU time, so we use the fastest JSON library
+    that is installed (orjson, then ujson) and fall back to the stdlib.
+
+    This also handles gzip compression of request and response bodies.
+"""
+
+import io
+import json
+import zlib
+
+import six
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class StdlibCodec(object):
+    name = "json"
+
+    # Whether loads() can parse a bytearray/memoryview without us
+    # copying it into a bytes object first
+    accepts_buffers = False
+
+    def dumps(self, data):
+        return json.dumps(data)
+
+    def loads(self, content):
+        return json.loads(content)
+
+
+class UJSONCodec(StdlibCodec):
+    name = "ujson"
+
+    def dumps(self, data):
+        # On Python 2 this is already UTF-8 encoded bytes
+        content = ujson.dumps(data, ensure_ascii=False)
+        if isinstance(content, six.text_type):
+            content = content.encode("utf-8")
+        return content
+
+    def loads(self, content):
+        return ujson.loads(content)
+
+
+class OrjsonCodec(StdlibCodec):
+    name = "orjson"
+    accepts_buffers = True
+
+    def dumps(self, data):
+        return orjson.dumps(data)
+
+    def loads(self, content):
+        return orjson.loads(content)
+
+
+CODECS = {
+    StdlibCodec.name: StdlibCodec,
+    UJSONCodec.name: UJSONCodec,
+    OrjsonCodec.name: OrjsonCodec,
+}
+
+
+def get_codec(name=None):
+    """
+        Returns a codec instance. If no name is given the fastest
+        available codec is returned.
+    """
+    if name is None:
+        if orjson is not None:
+            name = OrjsonCodec.name
+        elif ujson is not None:
+            name = UJSONCodec.name
+        else:
+            name = StdlibCodec.name
+
+    if name == OrjsonCodec.name and orjson is None:
+        raise ImportError("orjson is not installed")
+
+    if name == UJSONCodec.name and ujson is None:
+        raise ImportError("ujson is not installed")
+
+    return CODECS[name]()
+
+
+# Size of the reads we make from the socket when decompressing
+READ_CHUNK_SIZE = 64 * 1024
+
+# wbits value which makes zlib read and write gzip headers
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def gzip_compress(payload, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def _header(response, name):
+    headers = getattr(response, "headers", None) or {}
+    return headers.get(name)
+
+
+def _read_into_buffer(response, length):
+    """
+        Reads exactly `length` bytes from the response straight into a
+        preallocated bytearray so the body isn't copied chunk by chunk and
+        joined again at the end.
+    """
+    buff = bytearray(length)
+    view = memoryview(buff)
+    offset = 0
+    while offset < length:
+        read = response.readinto(view[offset:])
+        if not read:
+            break
+        offset += read
+
+    if offset != length:
+        return view[:offset]
+    return buff
+
+
+def _read_gzipped(response):
+    """
+        Decompresses the response as it comes off the socket, rather than
+        reading the whole compressed body and then inflating it. Returns
+        the decompressed body and the number of bytes read from the wire.
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    output = bytearray()
+    wire_bytes = 0
+    while True:
+        chunk = response.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        wire_bytes += len(chunk)
+        output.extend(decompressor.decompress(chunk))
+    output.extend(decompressor.flush())
+    return output, wire_bytes
+
+
+class _CountingStream(object):
+    """
+        File-like wrapper which counts the bytes read through it
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.wire_bytes = 0
+
+    def read(self, size=READ_CHUNK_SIZE):
+        chunk = self._file.read(size)
+        self.wire_bytes += len(chunk)
+        return chunk
+
+
+class _GzipStream(object):
+    """
+        File-like wrapper which decompresses a gzipped response as it's read
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._eof = False
+
+    @property
+    def wire_bytes(self):
+        return self._file.wire_bytes
+
+    def read(self, size=READ_CHUNK_SIZE):
+        output = b""
+        while not output and not self._eof:
+            chunk = self._file.read(size)
+            if chunk:
+                output = self._decompressor.decompress(chunk)
+            else:
+                self._eof = True
+                output = self._decompressor.flush()
+        return output
+
+
+def open_body_stream(response):
+    """
+        Returns a file-like object for reading the (decompressed) body
+        of a fetch response incrementally. Its wire_bytes attribute is the
+        number of bytes that have been read from the response so far.
+    """
+    content = getattr(response, "content", None)
+    fileobj = _CountingStream(io.BytesIO(content) if content is not None else response)
+
+    if (_header(response, "Content-Encoding") or "").lower() == "gzip":
+        return _GzipStream(fileobj)
+
+    return fileobj
+
+
+def read_body(response, codec):
+    """
+        Returns the body of a fetch response in the cheapest form that
+        the codec can parse, and the number of bytes that came over the
+        wire. GAE urlfetch responses are already fully read, urllib2
+        responses are file-like.
+    """
+    gzipped = (_header(response, "Content-Encoding") or "").lower() == "gzip"
+
+    content = getattr(response, "content", None)
+    if content is not None:
+        wire_bytes = len(content)
+        if gzipped:
+            content = zlib.decompress(content, GZIP_WBITS)
+        return content, wire_bytes
+
+    if gzipped:
+        content, wire_bytes = _read_gzipped(response)
+        if not codec.accepts_buffers:
+            content = bytes(content)
+        return content, wire_bytes
+
+    length = _header(response, "Content-Length")
+    if codec.accepts_buffers and length and hasattr(response, "readinto"):
+        content = _read_into_buffer(response, int(length))
+    else:
+        content = response.read()
+    return content, len(content)
@@ -0,0 +1,52 @@
+import sys
+import threading
+
+import six
+
+
+def run_concurrently(funcs, max_workers):
+    """
+        Calls each of the callables in `funcs` using up to `max_workers` threads
+        and returns their results in the same order. If any of them raise, the
+        first exception (in input order) is re-raised once they've all finished.
+    """
+    funcs = list(funcs)
+    results = [None] * len(funcs)
+    errors = [None] * len(funcs)
+
+    if len(funcs) <= 1 or max_workers <= 1:
+        for i, func in enumerate(funcs):
+            results[i] = func()
+        return results
+
+    lock = threading.Lock()
+    remaining = iter(enumerate(funcs))
+
+    def worker():
+        while True:
+            with lock:
+                try:
+                    i, func = next(remaining)
+                except StopIteration:
+                    return
+            try:
+                results[i] = func()
+            except Exception:
+                errors[i] = sys.exc_info()
+
+    threads = [
+        threading.Thread(target=worker)
+        for i in range(min(max_workers, len(funcs)))
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error:
+            six.reraise(*error)
+
+    return results
@@ -1,126 +1,658 @@
+import logging
+import os
+import sys
 import time
-import random
-import re
-import uuid
+import threading
 import six
-import json
+
+from contextlib import contextmanager
 
 from . import fetch as urlfetch
+from .auth import StaticCredentials
+from .codec import get_codec, gzip_compress, read_body
+from .stats import ConnectionStats, RequestStats, StatementStatsTable, DEFAULT_MAX_STATEMENTS
+from .streaming import StreamingResultSet
+from .bulk import BulkImporter, DEFAULT_WORKERS
+from .keygen import BlockKeyGenerator
+from .limits import MAX_COMMIT_SIZE_BYTES, MAX_MUTATIONS_PER_COMMIT, mutation_size
+from .schema import (
+    DEFAULT_SCHEMA_TTL,
+    Schema,
+    ddl_digest,
+    show_columns,
+    show_index,
+    show_tables
+)
+from .cache import ResultCache, DEFAULT_MAX_ENTRIES, DEFAULT_TTL
+from .singleflight import SingleFlight
+from .concurrency import run_concurrently
 from .cursor import Cursor
-from .errors import DatabaseError
+from .retry import (
+    DEFAULT_HEDGE_DELAY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TIMEOUT,
+    DEFAULT_TIMEOUT_POLICY,
+    Deadline,
+    LatencyTracker,
+    backoff_delay,
+    hedged_call,
+    rpc_name
+)
+from .pipeline import (
+    DEFAULT_WORKERS as DEFAULT_PIPELINE_WORKERS,
+    CommitChain,
+    CommitPipeline,
+    completed_future
+)
+from .pool import SessionPool, DEFAULT_MAX_SESSIONS
+from .errors import (
+    DatabaseError,
+    OperationalError,
+    ProgrammingError,
+    SessionNotFoundError,
+    error_from_response
+)
 from .endpoints import (
     ENDPOINT_SESSION_CREATE,
+    ENDPOINT_SESSION_BATCH_CREATE,
     ENDPOINT_UPDATE_DDL,
     ENDPOINT_OPERATION_GET,
-    ENDPOINT_BEGIN_TRANSACTION,
     ENDPOINT_GET_DDL,
     ENDPOINT_SQL_EXECUTE,
-    ENDPOINT_COMMIT
+    ENDPOINT_SQL_EXECUTE_STREAMING,
+    ENDPOINT_COMMIT,
+    ENDPOINT_ROLLBACK
 )
 
 from .parser import (
     QueryType,
     _determine_query_type,
-    parse_sql
+    fingerprint_sql,
+    normalize_sql,
+    parse_sql,
+    split_statements,
+    table_in_ddl,
+    tables_in_query
 )
 
 
+# Statements which take longer than Connection.slow_query_threshold are logged here
+slow_query_logger = logging.getLogger("pyspannerdb.slow_queries")
+
+
+def _params_key(params):
+    return tuple(sorted((k, repr(v)) for k, v in (params or {}).items()))
+
+
+def _timestamp_key(timestamp):
+    # RFC 3339 timestamps from Spanner have a variable number of fractional
+    # digits, so they can't be compared as strings
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    return seconds, fraction.ljust(9, "0")
+
+
+def _later_timestamp(first, second):
+    if first is None or second is None:
+        return first or second
+    return max(first, second, key=_timestamp_key)
+
+
+def _selector_key(selector):
+    # A hashable version of a (nested dict) transaction selector
+    if isinstance(selector, dict):
+        return tuple(sorted((k, _selector_key(v)) for k, v in selector.items()))
+    return selector
+
+
 def split_sql_on_semi_colons(sql):
-    inside_quotes = False
+    return split_statements(sql)
 
-    results = []
-    buff = []
 
-    for c in sql:
-        if c in ("'", '"', "`"):
-            inside_quotes = not inside_quotes
+# Request bodies at least this size are gzipped before sending
+DEFAULT_COMPRESSION_THRESHOLD = 16 * 1024
 
-        if c == ";" and not inside_quotes:
-            results.append("".join(buff))
-            buff = []
-        else:
-            buff.append(c)
+# Maximum number of statements execute_batch() runs at the same time
+DEFAULT_BATCH_CONCURRENCY = 8
+
+
+class _TransactionState(object):
+    """
+        Everything to do with the current transaction. Each thread using a
+        Connection has its own, so threads never see each other's mutations.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.transaction_id = None
+        self.transaction_type = None
+        self.mutations = []
+
+        # Running totals for the mutations, see Connection._add_mutation()
+        self.mutation_count = 0
+        self.mutation_bytes = 0
+        self.schema_operations = []
+        self.lastrowid = None
 
-    if buff:
-        results.append("".join(buff))
+        # Set by Connection.deadline()
+        self.deadline = None
 
-    return results
+
+class _CommitRecord(object):
+    """
+        The timestamp of a thread's most recent commit. This outlives the
+        thread's transactions, and pipelined commits update it from the
+        pipeline's thread.
+    """
+
+    def __init__(self):
+        self.timestamp = None
+
+    def update(self, timestamp):
+        self.timestamp = _later_timestamp(self.timestamp, timestamp)
+
+
+def _thread_state_property(name):
+    def getter(self):
+        return getattr(self._state, name)
+
+    def setter(self, value):
+        setattr(self._state, name, value)
+
+    return property(getter, setter)
 
 
 class Connection(object):
-    def __init__(self, project_id, instance_id, database_id, auth_token, debug=False):
+    """
+        A connection can be shared between threads (DB API threadsafety level 2).
+        Transaction state is per-thread, and each thread runs its transaction on
+        a session checked out from the connection's session pool.
+    """
+
+    _session = _thread_state_property("session")
+    _transaction_id = _thread_state_property("transaction_id")
+    _transaction_type = _thread_state_property("transaction_type")
+    _transaction_mutations = _thread_state_property("mutations")
+    _mutation_count = _thread_state_property("mutation_count")
+    _mutation_bytes = _thread_state_property("mutation_bytes")
+    _schema_operations = _thread_state_property("schema_operations")
+    _lastrowid = _thread_state_property("lastrowid")
+    _deadline = _thread_state_property("deadline")
+
+    def __init__(
+        self, project_id, instance_id, database_id, auth_token, debug=False, codec=None,
+        compression_threshold=DEFAULT_COMPRESSION_THRESHOLD, credentials=None,
+        max_sessions=DEFAULT_MAX_SESSIONS, min_sessions=1,
+        min_available_sessions=1, timeout=None, max_retries=DEFAULT_MAX_RETRIES
+    ):
         self.project_id = project_id
         self.instance_id = instance_id
         self.database_id = database_id
-        self.auth_token = auth_token
+
+        # Either pass a token directly (which can't be refreshed) or a
+        # credentials provider from pyspannerdb.auth
+        self.credentials = credentials or StaticCredentials(auth_token)
         self._autocommit = False
         self.debug = debug
 
-        self._transaction_id = None
-        self._transaction_mutations = []
-        self._schema_operations = []
-        self._lastrowid = None
-
-        self._session = self._create_session()
+        # JSON encoder/decoder for request and response bodies, this
+        # picks the fastest available library unless a name is passed
+        self.codec = get_codec(codec)
+
+        # Set to None to disable compression of request bodies
+        self.compression_threshold = compression_threshold
+        self.stats = ConnectionStats()
+
+        # Per-attempt timeout for every request, if this is None the timeout
+        # comes from timeout_policy based on the kind of RPC
+        self.timeout = timeout
+        self.timeout_policy = dict(DEFAULT_TIMEOUT_POLICY)
+        self.max_retries = max_retries
+
+        # See enable_hedged_reads()
+        self.hedged_reads = False
+        self.hedge_percentile = 95
+        self.min_hedge_delay = 0.05
+        self._read_latencies = LatencyTracker()
+
+        self._local = threading.local()
+
+        # The process which created the pool, see _check_fork()
+        self._pid = os.getpid()
+
+        # Sessions are created in the background before the pool runs out, and
+        # pinged when they're idle so that Spanner doesn't delete them
+        self._max_sessions = max_sessions
+        self._min_sessions = min_sessions
+        self._min_available_sessions = min_available_sessions
+        self._pool = self._create_pool()
+        self._pool.warm(min_sessions)
         self._pk_lookup = {}
 
-        half_sixty_four = ((2 ** 64) - 1) / 2
+        # See enable_result_cache()
+        self.result_cache = None
 
-        self._sequence_generator = lambda: (
-            random.randint(
-                -half_sixty_four,
-                (half_sixty_four - 1)
-            )
+        # See read_your_writes() and last_commit_timestamp
+        self._read_your_writes = False
+        self._last_commit_timestamp = None
+        self._commit_timestamp_lock = threading.Lock()
+
+        # Spanner's limits on a single commit, see _add_mutation()
+        self.max_commit_mutations = MAX_MUTATIONS_PER_COMMIT
+        self.max_commit_bytes = MAX_COMMIT_SIZE_BYTES
+
+        # See enable_single_flight()
+        self.single_flight = None
+
+        # See enable_statement_stats(), and set slow_query_threshold (in seconds)
+        # to log statements which take longer than that to slow_query_logger
+        self.statement_stats = None
+        self.slow_query_threshold = None
+
+        # Default row factory for new cursors, see pyspannerdb.rows
+        self.row_factory = None
+
+        # See pipeline_commits()
+        self._pipeline = None
+
+        # See schema()
+        self.schema_ttl = DEFAULT_SCHEMA_TTL
+        self._schema = None
+        self._schema_checked = 0
+        self._schema_lock = threading.Lock()
+
+        # Generates IDs for INSERTs which don't include the primary key,
+        # see set_sequence_generator()
+        self._sequence_generator = BlockKeyGenerator()
+        self._table_sequence_generators = {}
+
+    def _create_pool(self):
+        pool = SessionPool(
+            self._create_session, self._destroy_session, max_size=self._max_sessions,
+            batch_create_sessions=self._batch_create_sessions,
+            min_available=self._min_available_sessions
         )
+        pool.start_keep_alive(self._ping_session)
+        return pool
+
+    def _check_fork(self):
+        """
+            Connections can be created before a server forks its workers (e.g.
+            at import time under gunicorn or uwsgi). The child inherits copies of
+            our sessions, locks and thread-local state, but not our background
+            threads, so the first time a connection is used in a new process
+            it starts again with its own.
+        """
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+    def _reset_after_fork(self):
+        self._pid = os.getpid()
+
+        # Any lock could have been held by a thread which doesn't exist
+        # in the child, so none of them can be reused
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._commit_timestamp_lock = threading.Lock()
+        self.stats = ConnectionStats()
+        self._read_latencies = LatencyTracker()
+
+        if self.result_cache is not None:
+            self.result_cache = ResultCache(
+                self.result_cache.tables,
+                max_entries=self.result_cache.max_entries,
+                ttl=self.result_cache.ttl
+            )
+
+        if self.single_flight is not None:
+            self.single_flight = SingleFlight()
+
+        if self.statement_stats is not None:
+            self.statement_stats = StatementStatsTable(self.statement_stats.max_statements)
+
+        if self._pipeline is not None:
+            self._pipeline = CommitPipeline(self._pipeline.max_workers)
+
+        # Otherwise the child would generate the same keys as the parent
+        generators = [self._sequence_generator] + list(self._table_sequence_generators.values())
+        for generator in generators:
+            if hasattr(generator, "reset"):
+                generator.reset()
+
+        # The parent is still using its sessions, so we just forget about them
+        # rather than deleting them. New ones are created in the background so
+        # that we don't block whatever the child is doing right now
+        self._pool = self._create_pool()
+        self._pool.warm_async(self._min_sessions)
+
+    def warm_sessions(self, count, wait=True):
+        """
+            Makes sure the pool has at least `count` sessions, creating them with
+            a single batchCreate request. If wait is False they're created in the
+            background, which is useful when a worker process starts up.
+        """
+        self._check_fork()
+        if wait:
+            self._pool.warm(count)
+        else:
+            self._pool.warm_async(count)
 
     def refresh_pk_lookup(self):
         self._pk_lookup = self._query_pk_lookup()
 
+    def schema(self, refresh=False):
+        """
+            Returns the Schema model of the database (see pyspannerdb.schema). The DDL
+            is fetched once and cached. It's fetched again after this connection applies
+            DDL, and checked for changes made elsewhere every schema_ttl seconds (or now,
+            if refresh is True).
+        """
+        self._check_fork()
+        with self._schema_lock:
+            expired = time.time() - self._schema_checked >= self.schema_ttl
+            if self._schema is None or refresh or expired:
+                response = self._send_request(
+                    ENDPOINT_GET_DDL.format(**self.url_params()),
+                    None,
+                    method="GET",
+                    idempotent=True
+                )
+                statements = response.get("statements", [])
+
+                # Only re-parse if something actually changed
+                if self._schema is None or ddl_digest(statements) != self._schema.digest:
+                    self._schema = Schema(statements)
+                self._schema_checked = time.time()
+
+            return self._schema
+
+    def _invalidate_schema(self):
+        with self._schema_lock:
+            self._schema = None
+
     def _query_pk_lookup(self):
+        # If we're looking up primary keys, we're missing a table
+        # so make sure we see any new ones
+        schema = self.schema(refresh=True)
+        return dict(
+            (table.name, table.primary_key[0])
+            for table in schema.tables.values() if table.primary_key
+        )
+
+    def _query_column_types(self, table):
+        """
+            Returns a dictionary of column name to Spanner type (e.g. STRING(MAX))
+        """
+        schema = self.schema()
+        if table not in schema.tables:
+            schema = self.schema(refresh=True)
+
+        table = schema.tables.get(table)
+        return dict(
+            (column.name, column.spanner_type) for column in (table.columns if table else [])
+        )
+
+    def _query_index_states(self, table):
+        """
+            Returns a dictionary of index name to INDEX_STATE
+        """
         sql = """
-SELECT DISTINCT
-  I.TABLE_NAME,
-  IC.COLUMN_NAME
+SELECT
+  INDEX_NAME,
+  INDEX_STATE
 FROM
-  information_schema.indexes AS I
-INNER JOIN
-  information_schema.index_columns as IC
-on I.INDEX_NAME = IC.INDEX_NAME and I.TABLE_NAME = IC.TABLE_NAME
-WHERE I.INDEX_TYPE = "PRIMARY_KEY"
-AND IC.TABLE_SCHEMA = ''
+  information_schema.indexes
+WHERE TABLE_NAME = @table
+AND TABLE_SCHEMA = ''
+AND INDEX_TYPE = 'INDEX'
 """.strip()
 
-        temp_session = None
+        temp_session = self._pool.acquire()
         try:
-            temp_session = self._create_session()
-            results = self._run_query(sql, None, None, override_session=temp_session)
+            results = self._run_query(
+                sql, {"table": table}, {"table": {"code": "STRING"}},
+                override_session=temp_session
+            )
         finally:
-            if temp_session:
-                self._destroy_session(temp_session)
+            self._pool.release(temp_session)
 
         return dict(results.get('rows', []))
 
-    def set_sequence_generator(self, func):
-        self._sequence_generator = func
+    def enable_result_cache(self, tables, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        """
+            Caches the results of SELECT statements which only read from `tables`.
+            Cached results are dropped after `ttl` seconds, or as soon as this
+            connection commits mutations or DDL affecting one of the tables.
+        """
+        self.result_cache = ResultCache(tables, max_entries=max_entries, ttl=ttl)
+
+    def disable_result_cache(self):
+        self.result_cache = None
+
+    def read_your_writes(self, value):
+        """
+            When enabled, reads outside of read-write transactions are no longer
+            strong once this thread has committed. Autocommitted reads (and
+            execute_batch()) read at or after the thread's last commit timestamp
+            (minReadTimestamp), so any replica which has caught up with the commit
+            can serve them. readOnly transactions are still strong.
+        """
+        self._read_your_writes = value
+
+    @property
+    def commit_timestamp(self):
+        """
+            The timestamp (RFC 3339) of this thread's most recent commit
+        """
+        return self._commit_record.timestamp
+
+    @property
+    def last_commit_timestamp(self):
+        """
+            The latest commit timestamp of any commit made with this connection,
+            including bulk imports
+        """
+        return self._last_commit_timestamp
+
+    @property
+    def _commit_record(self):
+        record = getattr(self._local, "commit_record", None)
+        if record is None:
+            record = self._local.commit_record = _CommitRecord()
+        return record
+
+    def _record_commit_timestamp(self, response):
+        timestamp = (response or {}).get("commitTimestamp")
+        if timestamp:
+            with self._commit_timestamp_lock:
+                self._last_commit_timestamp = _later_timestamp(
+                    self._last_commit_timestamp, timestamp
+                )
+        return timestamp
+
+    def _read_only_options(self):
+        """
+            The readOnly options for a new single-use read, None for a strong read.
+            Bounded staleness isn't allowed when beginning a transaction, so readOnly
+            transactions are always strong.
+        """
+        timestamp = self._commit_record.timestamp if self._read_your_writes else None
+        if timestamp is None:
+            return None
+        return {"minReadTimestamp": timestamp}
+
+    def enable_statement_stats(self, max_statements=DEFAULT_MAX_STATEMENTS):
+        """
+            Keeps totals (count, latency, rows and bytes) for each statement
+            fingerprint executed with Cursor.execute(), see pyspannerdb.stats
+        """
+        self.statement_stats = StatementStatsTable(max_statements)
+
+    def disable_statement_stats(self):
+        self.statement_stats = None
+
+    @property
+    def _bytes_transferred(self):
+        # Bytes sent and received by requests made from this thread
+        return getattr(self._local, "bytes_transferred", 0)
+
+    def _record_request(self, request_stats):
+        self.stats.record_request(request_stats)
+        self._local.bytes_transferred = (
+            self._bytes_transferred + request_stats.sent + request_stats.received
+        )
+
+    def _record_statement(self, sql, latency, rows, bytes_transferred):
+        statement_stats = self.statement_stats
+        threshold = self.slow_query_threshold
+        slow = threshold is not None and latency >= threshold
+        if statement_stats is None and not slow:
+            return
+
+        fingerprint = fingerprint_sql(sql)
+        if statement_stats is not None:
+            statement_stats.record(fingerprint, latency, rows, bytes_transferred)
+
+        if slow:
+            slow_query_logger.warning(
+                "Slow query (%.3fs, %d rows, %d bytes): %s",
+                latency, rows, bytes_transferred, fingerprint
+            )
+
+    def enable_single_flight(self):
+        """
+            Reads outside of read-write transactions (autocommitted reads and
+            execute_batch() statements) which are identical to a read that's
+            already in flight wait for its response instead of sending their own.
+            See pyspannerdb.singleflight.
+        """
+        self.single_flight = SingleFlight()
+
+    def disable_single_flight(self):
+        self.single_flight = None
+
+    def enable_hedged_reads(self, percentile=95, min_delay=0.05):
+        """
+            Autocommitted (single-use) reads which take longer than `percentile`
+            of recent reads are sent again on a second session, and the first
+            response wins. This trades a few extra requests for a lower tail latency.
+        """
+        self.hedged_reads = True
+        self.hedge_percentile = percentile
+        self.min_hedge_delay = min_delay
+
+    def disable_hedged_reads(self):
+        self.hedged_reads = False
+
+    def set_sequence_generator(self, func, table=None):
+        """
+            Sets the function used to generate IDs for INSERTs which don't include
+            the primary key (see pyspannerdb.keygen), either for all tables or just
+            for `table`. Pass None to disable ID generation.
+        """
+        if table is None:
+            self._sequence_generator = func
+        else:
+            self._table_sequence_generators[table] = func
+
+    @property
+    def auth_token(self):
+        return self.credentials.get_token()
+
+    @property
+    def _state(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = self._local.state = _TransactionState()
+        return state
+
+    def _bind_session(self):
+        """
+            Returns the session for this thread's transaction, checking
+            one out of the pool if the transaction doesn't have one yet
+        """
+        if self._session is None:
+            self._session = self._pool.acquire()
+        return self._session
+
+    def _release_session(self):
+        if self._session is not None:
+            self._pool.release(self._session)
+            self._session = None
 
     def url_params(self):
         return {
             "pid": self.project_id,
             "iid": self.instance_id,
             "did": self.database_id,
-            "sid": getattr(self, "_session", None) # won't exist when creating a session
+            "sid": self._session  # None when creating a session
         }
 
     def _create_session(self):
         params = self.url_params()
         response = self._send_request(
-            ENDPOINT_SESSION_CREATE.format(**params), {}
+            ENDPOINT_SESSION_CREATE.format(**params), {}, idempotent=True
         )
 
         # For some bizarre reason, this returns the full URL to the session
         # so we just extract the session ID here!
         return response["name"].rsplit("/")[-1]
 
+    def _batch_create_sessions(self, count):
+        params = self.url_params()
+        sessions = []
+
+        # The server may return fewer sessions than we asked for
+        while len(sessions) < count:
+            response = self._send_request(
+                ENDPOINT_SESSION_BATCH_CREATE.format(**params),
+                {"sessionCount": count - len(sessions)},
+                idempotent=True
+            )
+            created = response.get("session", [])
+            if not created:
+                break
+
+            sessions.extend(session["name"].rsplit("/")[-1] for session in created)
+
+        return sessions
+
+    def _ping_session(self, session):
+        url_params = self.url_params()
+        url_params["sid"] = session
+        self._send_request(ENDPOINT_SQL_EXECUTE.format(**url_params), {"sql": "SELECT 1"})
+
+    def _send_session_request(self, endpoint, session, data, recover=True, **kwargs):
+        """
+            Sends a request to an endpoint of `session`. If the server has deleted
+            the session it's removed from the pool, and if `recover` is True (the
+            request isn't part of an existing transaction) it's sent again on a
+            new session.
+        """
+        url_params = self.url_params()
+        url_params["sid"] = session
+        try:
+            return self._send_request(endpoint.format(**url_params), data, **kwargs)
+        except SessionNotFoundError:
+            self._pool.discard(session)
+            bound = (self._session == session)
+            if bound:
+                self._session = None
+
+            if not recover:
+                raise
+
+        if bound:
+            # Carry on this thread's transaction on the new session
+            url_params["sid"] = self._bind_session()
+            return self._send_request(endpoint.format(**url_params), data, **kwargs)
+
+        session = self._pool.acquire()
+        try:
+            url_params["sid"] = session
+            return self._send_request(endpoint.format(**url_params), data, **kwargs)
+        finally:
+            self._pool.release(session)
+
     def _parse_mutation(self, sql, params, types):
         """
             Spanner doesn't support insert/update/delete/replace etc. queries
@@ -169,17 +701,28 @@ AND IC.TABLE_SCHEMA = ''
 
         table = m['table']
 
+        generator = self._table_sequence_generators.get(table, self._sequence_generator)
+        if generator is None:
+            return mutation
+
         # If we don't know what the PK column is for this
         # table, then refresh our listing
         if table not in self._pk_lookup:
+            # The table may be created by batched DDL, e.g. earlier in the same script
+            if any(table_in_ddl(statement) == table for statement in self._ddl_batch or []):
+                self._flush_ddl_batch()
             self.refresh_pk_lookup()
 
-        pk_column = self._pk_lookup[table]
+        pk_column = self._pk_lookup.get(table)
+        if pk_column is None:
+            raise ProgrammingError(
+                "Unable to generate a primary key, table {} doesn't exist".format(table)
+            )
         if pk_column not in m['columns']:
             m['columns'].insert(0, pk_column)
 
             for row in m['values']:
-                self._lastrowid = self._sequence_generator()
+                self._lastrowid = generator()
 
                 # INT64 must be sent as a string :(
                 row.insert(0, six.text_type(self._lastrowid))
@@ -193,41 +736,116 @@ AND IC.TABLE_SCHEMA = ''
         if not self._schema_operations:
             return
 
-        # Operation IDs must start with a letter
-        operation_id = "x" + uuid.uuid4().hex.replace("-", "_")
-
-        data = {
-            "statements": self._schema_operations,
-            "operationId": operation_id
-        }
+        return self._update_ddl(self._schema_operations, wait=wait)
 
+    def _update_ddl(self, statements, wait=True):
+        """
+            Sends the statements as a single updateDdl operation. If wait is True,
+            polls the operation until it has finished.
+        """
         url_params = self.url_params()
 
+        # Even if this fails, some statements may have been applied
+        self._invalidate_schema()
+
+        # uuid loads ctypes on Python 2, so it's only imported when DDL is applied
+        import uuid
+
+        # Operation IDs must start with a letter
+        operation_id = "x" + uuid.uuid4().hex.replace("-", "_")
+
         response = self._send_request(
             ENDPOINT_UPDATE_DDL.format(**url_params),
-            data,
+            {
+                "statements": statements,
+                "operationId": operation_id
+            },
             method="PATCH"
         )
 
         if wait:
-            # Wait for the operation to finish
-            done = False
-            params = url_params.copy()
-            params["oid"] = operation_id
-            while not done:
-                status = self._send_request(
-                    ENDPOINT_OPERATION_GET.format(**params), data=None, method="GET"
-                )
-                done = status.get("done", False)
-                time.sleep(0.25)
+            self._wait_for_operation(operation_id)
 
+        # Don't use a schema fetched while the DDL was running
+        self._invalidate_schema()
         return response
 
+    def _wait_for_operation(self, operation_id):
+        params = self.url_params()
+        params["oid"] = operation_id
+
+        while True:
+            status = self._send_request(
+                ENDPOINT_OPERATION_GET.format(**params), data=None, method="GET",
+                idempotent=True
+            )
+            if status.get("done", False):
+                break
+            time.sleep(0.25)
+
+        if "error" in status:
+            raise DatabaseError("Schema update failed: {}".format(
+                status["error"].get("message", operation_id)
+            ))
+
+    @contextmanager
+    def batch_ddl(self):
+        """
+            Collects the DDL statements executed in this thread inside the block, and
+            applies them when the block exits (unless it raises). They're sent as a single
+            updateDdl operation, in the order they ran.
+
+                with connection.batch_ddl():
+                    for migration in migrations:
+                        cursor.execute(migration)
+
+            Only DDL is deferred, other statements run as normal.
+        """
+        if self._ddl_batch is not None:
+            # Already batching, the outermost block applies everything
+            yield
+            return
+
+        batch = self._local.ddl_batch = []
+        try:
+            yield
+        finally:
+            self._local.ddl_batch = None
+
+        if batch:
+            self._apply_ddl_batch(batch)
+
+    @property
+    def _ddl_batch(self):
+        return getattr(self._local, "ddl_batch", None)
+
+    def _apply_ddl_batch(self, statements):
+        try:
+            self._update_ddl(statements)
+        finally:
+            self._invalidate_cached_results([], statements)
+
+    def _flush_ddl_batch(self):
+        """
+            Applies the DDL collected by batch_ddl() so far, for when what
+            follows depends on it
+        """
+        batch = self._ddl_batch
+        if batch:
+            statements = list(batch)
+            del batch[:]
+            self._apply_ddl_batch(statements)
+
     def _send_ddl_update(self, sql):
         assert(_determine_query_type(sql) == QueryType.DDL)
 
+        # Inside batch_ddl() statements are kept until the end of the block
+        operations = self._ddl_batch
+        if operations is None:
+            operations = self._schema_operations
+
         for statement in split_sql_on_semi_colons(sql):
-            self._schema_operations.append(statement)
+            operations.append(statement)
 
         # Make sure we have some stub field information for the cursor to pick up
         # at the moment it is empty, but we should probably do whatever MySQL returns if you
@@ -250,68 +868,53 @@ AND IC.TABLE_SCHEMA = ''
             to make it accessible
         """
         sql = sql.strip()
-        if sql.upper().startswith("SHOW DDL"):
-            regex = re.compile(
-                "\s*CREATE\s+TABLE\s+(?P<table>[a-zA-Z0-9_-]+)|"
-                "\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(?P<index>[a-zA-Z0-9_-]+)"
-            )
-
+        command = sql.upper()
+        if command.startswith("SHOW DDL"):
             obj = sql[len("SHOW DDL"):].strip()
-            url_params = self.url_params()
-
-            response = self._send_request(
-                ENDPOINT_GET_DDL.format(**url_params),
-                None,
-                method="GET"
-            )
+            schema = self.schema()
 
-            result = []
             if obj:
-                for statement in response['statements']:
-                    match = regex.match(statement)
-                    table_or_index = match and (match.group("table") or match.group("index"))
-                    if match and table_or_index == obj:
-                        result = [statement]
-                        break
+                result = schema.ddl(obj)
             else:
-                result = ["; ".join(response['statements'])]
+                result = ["; ".join(schema.ddl())]
 
             return {
                 "rows": result
             }
-        elif sql.upper().startswith("SHOW INDEX FROM"):
-            obj = sql[len("SHOW INDEX FROM"):].strip()
-
-            sql = """
-SELECT DISTINCT
-  I.TABLE_NAME,
-  I.INDEX_NAME,
-  I.INDEX_TYPE,
-  I.IS_UNIQUE,
-  I.IS_NULL_FILTERED,
-  I.INDEX_STATE
-FROM
-  information_schema.indexes AS I
-INNER JOIN
-  information_schema.index_columns as IC
-on I.INDEX_NAME = IC.INDEX_NAME and I.TABLE_NAME = IC.TABLE_NAME
-WHERE I.TABLE_NAME = @table
-AND IC.TABLE_SCHEMA = ''
-""".lstrip()
-
-            return self._run_query(
-                sql, {"table": obj}, {"table": {"code": "STRING"}}
-            )
+        elif command.startswith("SHOW INDEX FROM"):
+            table = sql[len("SHOW INDEX FROM"):].strip()
+            schema = self.schema()
+
+            # The state of an index isn't in the DDL
+            index_states = self._query_index_states(table) if table in schema.tables else {}
+            return show_index(schema, table, index_states)
+        elif command.startswith("SHOW COLUMNS FROM"):
+            return show_columns(self.schema(), sql[len("SHOW COLUMNS FROM"):].strip())
+        elif command == "SHOW TABLES":
+            return show_tables(self.schema())
         else:
             raise DatabaseError("Unsupported custom SQL")
 
-    def _run_query(self, sql, params, types, override_session=None):
+    def _run_query(self, sql, params, types, override_session=None, transaction=None, stream=False):
+        """
+            Runs a statement in this thread's transaction. If override_session is
+            passed the statement runs on that session instead, outside of the
+            transaction, using the `transaction` selector if one is given.
+
+            If stream is True, reads use executeStreamingSql and the response
+            contains a StreamingResultSet under "_stream" instead of "rows".
+        """
+        self._check_fork()
         data = {
-            "session": self._session,
-            "transaction": None if override_session else self._transaction_id,
             "sql": sql
         }
 
+        if override_session:
+            if transaction:
+                data["transaction"] = transaction
+        elif self._transaction_id:
+            data["transaction"] = {"id": self._transaction_id}
+
         if params:
             data.update({
                 "params": params,
@@ -333,57 +936,85 @@ AND IC.TABLE_SCHEMA = ''
                 return self._run_custom_query(sql, params, types)
         elif query_type == QueryType.DDL:
             response = self._send_ddl_update(sql)
-            if self._autocommit:
+            if self._autocommit and self._ddl_batch is None and not self._commit_deferred:
                 self.commit()
             return response
 
-
-        # If we're running a query, with no active transaction then start a transaction
-        # as part of this query. We use readWrite if it's an INSERT or UPDATE or CREATE or whatever
+        # If we're running a read with no active transaction then start one as part of
+        # this query. Writes don't need a transaction until commit, they're just buffered.
         # We don't start a transaction if we've overridden the session, that's just a temporary thing
-        if not self._transaction_id and not override_session:
-            if self._autocommit:
-                # Autocommit means this is a single-use transaction, however passing singleUse
-                # to executeSql is apparently illegal... for some reason?
-                transaction_type = transaction_type or (
-                    "readOnly" if query_type == QueryType.READ else "readWrite"
-                )
+        if query_type == QueryType.READ and not self._transaction_id and not override_session:
+            if self._autocommit and not transaction_type:
+                # Autocommitted reads are a single-use readOnly transaction, there's
+                # nothing to commit afterwards. (singleUse readWrite isn't allowed
+                # by executeSql, but we never need that for a read)
+                data["transaction"] = {"singleUse": {
+                    "readOnly": self._read_only_options() or {"strong": True}
+                }}
+            elif transaction_type == "readOnly":
+                # Strong, pinning it to the last commit could read arbitrarily old data
+                data["transaction"] = {"begin": {"readOnly": {}}}
             else:
                 # If autocommit is disabled, we have to assume a readWrite transaction
                 # as even if the query type is READ, subsequent queries within the transaction
                 # may include UPDATEs
-                transaction_type = transaction_type or "readWrite"
-
-            # Begin a transaction as part of this query if we are autocommitting
-            data["transaction"] = {"begin": {transaction_type: {}}}
+                transaction_type = "readWrite"
+                data["transaction"] = {"begin": {transaction_type: {}}}
 
-        url_params = self.url_params()
-        if override_session is not None:
-            url_params["sid"] = override_session
-
-        transaction_id = None
         if query_type == QueryType.READ:
-            result = self._send_request(
-                ENDPOINT_SQL_EXECUTE.format(**url_params),
-                data
-            )
-
-            transaction_id = result.get("transaction", {}).get("id")
+            if self._pipeline is not None and not override_session:
+                # Make sure we read our own pipelined writes
+                self._wait_for_pending_commit()
+
+            if stream:
+                return self._run_streaming_query(data, override_session, transaction_type)
+
+            # Only single-use reads can be cached. A read which begins (or runs
+            # in) a transaction has to actually run, to take its locks
+            cache_key = None
+            single_use = "singleUse" in data.get("transaction", {})
+            if self.result_cache is not None and not override_session and single_use and \
+                    not self._transaction_id:
+                tables = tables_in_query(sql)
+                if self.result_cache.cacheable(tables):
+                    cache_key = (normalize_sql(sql), _params_key(params))
+
+            result = self.result_cache.get(cache_key) if cache_key else None
+            if result is None:
+                def read():
+                    if self.hedged_reads and single_use:
+                        return self._hedged_read(data, override_session)
+                    return self._execute_sql(override_session or self._bind_session(), data)
+
+                single_flight = self.single_flight
+                if single_flight is not None and single_use:
+                    result = single_flight.run((
+                        normalize_sql(data["sql"]),
+                        _params_key(params),
+                        _params_key(types),
+                        _selector_key(data["transaction"])
+                    ), read)
+                else:
+                    result = read()
+
+                transaction_id = result.get("metadata", {}).get("transaction", {}).get("id")
+                if transaction_id and transaction_type:
+                    # Keep the current transaction id active
+                    self._transaction_id = transaction_id
+                    self._transaction_type = transaction_type
+
+                if cache_key:
+                    self.result_cache.put(cache_key, tables, result)
         elif query_type == QueryType.WRITE:
-            if not self._transaction_id:
-                # Start a new transaction, but store the mutation for the commit
-                result = self._send_request(
-                    ENDPOINT_BEGIN_TRANSACTION.format(**url_params),
-                    {"options": {"readWrite": {}}}
-                )
+            if self._transaction_type == "readOnly":
+                raise ProgrammingError("Can't write in a read-only transaction")
 
-                transaction_id = result["id"]
-            else:
-                result = {}
+            # No RPC here, the mutation is sent when the transaction is committed
+            result = {}
 
             mutation = self._parse_mutation(sql, params, types)
             mutation = self._generate_pk_for_insert(mutation)
-            self._transaction_mutations.append(mutation)
+            self._add_mutation(mutation)
 
             # This will be set by _generate_pk_for_insert if necessary
             # we store it in a custom field in the result so the cursor
@@ -392,37 +1023,372 @@ AND IC.TABLE_SCHEMA = ''
                 result["_lastrowid"] = self._lastrowid
                 self._lastrowid = None
 
-        if transaction_id:
-            # Keep the current transaction id active
-            self._transaction_id = transaction_id
-
         # If auto-commit is enabled, then commit the active transaction
-        if self._autocommit and not override_session:
+        if self._autocommit and not override_session and not self._commit_deferred:
             self.commit()
 
         return result
 
-    def _send_request(self, url, data, method="POST"):
-        def get_method():
-            assert(method in ("GET", "POST", "PUT", "PATCH", "HEAD", "DELETE"))
-            return getattr(urlfetch, method)
+    def _add_mutation(self, mutation):
+        """
+            Adds a mutation to this thread's transaction, keeping a running total
+            of its size. If the transaction would go over Spanner's limits, then
+            in autocommit mode (e.g. a script or executemany()) the mutations so far
+            are committed first so every commit is as big as it can be (applying any
+            DDL batched before them). In an explicit
+            transaction we raise now, rather than when the commit is rejected.
+        """
+        count, size = mutation_size(mutation)
+        if count > self.max_commit_mutations or size > self.max_commit_bytes:
+            raise ProgrammingError(
+                "Statement is too large for a single commit ({} mutations, roughly {} bytes)".format(
+                    count, size
+                )
+            )
 
-        payload = json.dumps(data) if data else None
-        response = urlfetch.fetch(
-            url,
-            payload=payload,
-            method=get_method(),
-            headers={
-                'Authorization': 'Bearer {}'.format(self.auth_token),
-                'Content-Type': 'application/json'
-            },
-            debug=self.debug
+        if self._mutation_count + count > self.max_commit_mutations or \
+                self._mutation_bytes + size > self.max_commit_bytes:
+            if not self._autocommit:
+                raise ProgrammingError(
+                    "Transaction has reached Spanner's limit of {} mutations or {} bytes "
+                    "per commit, commit it and continue in a new transaction".format(
+                        self.max_commit_mutations, self.max_commit_bytes
+                    )
+                )
+
+            # The writes so far may depend on DDL from earlier in the script (e.g.
+            # a CREATE TABLE), so that has to be applied before they're committed
+            self._flush_ddl_batch()
+            self.commit()
+
+        self._transaction_mutations.append(mutation)
+        self._mutation_count += count
+        self._mutation_bytes += size
+
+    @property
+    def _commit_deferred(self):
+        return getattr(self._local, "defer_commit", False)
+
+    def _run_script(self, queries):
+        """
+            Runs a list of (sql, params, types) and returns their results. In
+            autocommit mode the DDL is applied as one batch and then all the writes
+            are sent in a single commit when the script finishes, rather than after
+            each statement. Reads run as they come, so they don't see the writes.
+
+            Writes which don't fit in one commit are split across several (see
+            _add_mutation()), so a script which fails part way through may have
+            committed some of its writes.
+        """
+        self._check_fork()
+        if not self._autocommit:
+            return [self._run_query(*query) for query in queries]
+
+        self._local.defer_commit = True
+        try:
+            with self.batch_ddl():
+                results = [self._run_query(*query) for query in queries]
+        except Exception:
+            self.rollback()
+            raise
+        finally:
+            self._local.defer_commit = False
+
+        self.commit()
+        return results
+
+    def _execute_sql(self, session, data):
+        # Reads are safe to retry, if the first attempt began a transaction
+        # we just never use it. If the session has gone, we can only move
+        # to another one if we're not already in a transaction
+        return self._send_session_request(
+            ENDPOINT_SQL_EXECUTE, session, data,
+            recover="id" not in data.get("transaction", {}),
+            idempotent=True
         )
-        if not str(response.getcode()).startswith("2"):
-            raise DatabaseError("Error sending database request: {}".format(response.content))
 
-        return json.loads(response.read())
+    def _hedged_read(self, data, session=None):
+        """
+            Runs a single-use read, sending a second copy of the request on
+            another session if the first is slower than hedge_percentile of
+            recent reads. Whichever response arrives first is used.
+        """
+        deadline = self._deadline
+        sessions = [session] if session else []
+
+        def attempt():
+            # Runs in its own thread, so carry over the caller's deadline
+            self._deadline = deadline
+            try:
+                own_session = sessions.pop()
+            except IndexError:
+                own_session = None
+
+            session = own_session or self._pool.acquire()
+            try:
+                return self._execute_sql(session, data)
+            finally:
+                if own_session is None:
+                    self._pool.release(session)
+
+        delay = max(
+            self._read_latencies.percentile(self.hedge_percentile, DEFAULT_HEDGE_DELAY),
+            self.min_hedge_delay
+        )
+        return hedged_call(attempt, delay)
+
+    def _run_streaming_query(self, data, override_session, transaction_type):
+        release = None
+        if override_session:
+            session = override_session
+        elif self._autocommit and not self._transaction_id:
+            # The session must stay checked out until the caller has read the
+            # whole stream, not just until the autocommit at the end of _run_query
+            session = self._pool.acquire()
+            release = lambda: self._pool.release(session)
+        else:
+            session = self._bind_session()
 
+        url_params = self.url_params()
+        url_params["sid"] = session
+
+        def on_close():
+            # The body wasn't counted when the request was sent
+            self.stats.record_stream(result.bytes_received, result.bytes_received_uncompressed)
+            if release:
+                release()
+
+        try:
+            response = self._send_request(
+                ENDPOINT_SQL_EXECUTE_STREAMING.format(**url_params), data, stream=True,
+                idempotent=True
+            )
+            result = StreamingResultSet(response, on_close=on_close)
+        except Exception:
+            if release:
+                release()
+            raise
+
+        transaction_id = result.metadata.get("transaction", {}).get("id")
+        if transaction_id and transaction_type:
+            self._transaction_id = transaction_id
+            self._transaction_type = transaction_type
+
+        return {
+            "metadata": result.metadata,
+            "_stream": result
+        }
+
+    @contextmanager
+    def deadline(self, timeout):
+        """
+            Everything run in this thread inside the block (including retries)
+            must finish within `timeout` seconds, or OperationalError is raised
+
+                with connection.deadline(5):
+                    cursor.execute(...)
+        """
+        previous = self._deadline
+        self._deadline = Deadline(timeout)
+        try:
+            yield
+        finally:
+            self._deadline = previous
+
+    def _request_timeout(self, url):
+        timeout = self.timeout
+        if timeout is None:
+            timeout = self.timeout_policy.get(rpc_name(url), DEFAULT_TIMEOUT)
+
+        if self._deadline is not None:
+            remaining = self._deadline.remaining()
+            if remaining <= 0:
+                error = OperationalError("Deadline exceeded before sending request to {}".format(url))
+                error.retryable = False
+                raise error
+            timeout = min(timeout, remaining)
+
+        return timeout
+
+    def _send_request(
+        self, url, data, method="POST", stream=False, idempotent=False, retry_statuses=()
+    ):
+        """
+            Sends a request to the API and returns the decoded JSON response. If
+            stream is True, the (unread) response object is returned instead
+            when the request succeeds.
+
+            Idempotent requests are retried (with backoff) when they time out
+            or fail with a retryable error. Other requests are only retried for
+            errors with one of the given retry_statuses, for which the server
+            guarantees nothing was applied (e.g. ABORTED for a single-use commit).
+        """
+        assert(method in ("GET", "POST", "PUT", "PATCH", "HEAD", "DELETE"))
+        self._check_fork()
+
+        payload = self.codec.dumps(data) if data else None
+        uncompressed_size = len(payload) if payload else 0
+        compressed = False
+        if payload and self.compression_threshold is not None and \
+                uncompressed_size >= self.compression_threshold:
+            payload = gzip_compress(payload)
+            compressed = True
+
+        attempt = 0
+        while True:
+            try:
+                return self._send_request_once(
+                    url, payload, uncompressed_size, compressed, method, stream
+                )
+            except DatabaseError as e:
+                retry = (idempotent and e.retryable) or e.status in retry_statuses
+                if not retry or attempt >= self.max_retries:
+                    raise
+
+                # Wait as long as the server asked us to, if it did
+                delay = e.retry_delay if e.retry_delay is not None else backoff_delay(attempt)
+                if self._deadline is not None and self._deadline.remaining() <= delay:
+                    raise
+
+                time.sleep(delay)
+                attempt += 1
+
+    def _send_request_once(
+        self, url, payload, uncompressed_size, compressed, method, stream, _retry_auth=True
+    ):
+        headers = {
+            'Authorization': 'Bearer {}'.format(self.auth_token),
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip'
+        }
+        if compressed:
+            headers['Content-Encoding'] = 'gzip'
+
+        timeout = self._request_timeout(url)
+        start = time.time()
+
+        try:
+            response = urlfetch.fetch(
+                url,
+                payload=payload,
+                method=getattr(urlfetch, method),
+                headers=headers,
+                deadline=timeout,
+                debug=self.debug
+            )
+            status_code = urlfetch.status_code(response)
+
+            if stream and str(status_code).startswith("2"):
+                # We don't know how much we'll receive until the caller reads it all
+                self._record_request(RequestStats(
+                    url, len(payload) if payload else 0, uncompressed_size, 0, 0
+                ))
+                return response
+
+            content, received = read_body(response, self.codec)
+        except urlfetch.NETWORK_ERRORS + urlfetch.TIMEOUT_ERRORS as e:
+            if urlfetch.is_timeout(e):
+                error = OperationalError(
+                    "Request to {} timed out after {:.1f}s".format(url, time.time() - start)
+                )
+            else:
+                error = OperationalError("Error connecting to {}: {}".format(url, e))
+
+            error.retryable = True
+            six.reraise(OperationalError, error, sys.exc_info()[2])
+
+        self._record_request(RequestStats(
+            url,
+            len(payload) if payload else 0,
+            uncompressed_size,
+            received,
+            len(content)
+        ))
+
+        if status_code == 401 and _retry_auth and self.credentials.refresh():
+            # The token expired or was revoked, retry once with a fresh one
+            return self._send_request_once(
+                url, payload, uncompressed_size, compressed, method, stream,
+                _retry_auth=False
+            )
+
+        if not str(status_code).startswith("2"):
+            raise error_from_response(status_code, content, self.codec)
+
+        if rpc_name(url) == "executeSql":
+            self._read_latencies.record(time.time() - start)
+
+        return self.codec.loads(content)
+
+    def execute_batch(
+        self, statements, max_concurrency=DEFAULT_BATCH_CONCURRENCY,
+        read_timestamp=None, exact_staleness=None
+    ):
+        """
+            Runs a list of independent (sql, params) read statements concurrently,
+            each on its own pooled session, and returns a cursor for each statement
+            in the same order.
+
+            All the statements read the same snapshot. That's read_timestamp (an RFC 3339
+            timestamp string) or exact_staleness (in seconds) if one is given. Otherwise
+            the first statement is a strong read (or reads at or after this thread's last
+            commit, see read_your_writes()) and the rest run after it, at the timestamp
+            it read at.
+
+            The statements don't run in this thread's transaction.
+        """
+        self._check_fork()
+        if read_timestamp is not None:
+            read_only = {"readTimestamp": read_timestamp}
+        elif exact_staleness is not None:
+            read_only = {"exactStaleness": "{}s".format(exact_staleness)}
+        else:
+            read_only = None
+
+        prepared = []
+        for sql, params in statements:
+            if _determine_query_type(sql) != QueryType.READ:
+                raise ProgrammingError("execute_batch only supports SELECT statements")
+
+            cursor = self.cursor()
+            prepared.append((cursor,) + cursor._format_query(sql, params or []))
+
+        deadline = self._deadline
+
+        def run(read_only, cursor, sql, params, types):
+            selector = {"singleUse": {"readOnly": read_only}}
+
+            def _run():
+                # May run in another thread, so carry over the caller's deadline
+                self._deadline = deadline
+                session = self._pool.acquire()
+                try:
+                    response = self._run_query(
+                        sql, params, types, override_session=session, transaction=selector
+                    )
+                finally:
+                    self._pool.release(session)
+
+                cursor._set_response(response)
+                return cursor
+            return _run
+
+        first = []
+        if read_only is None and prepared:
+            read_only = dict(
+                self._read_only_options() or {"strong": True},
+                returnReadTimestamp=True
+            )
+            first = [run(read_only, *prepared.pop(0))()]
+
+            timestamp = first[0]._last_response.get(
+                "metadata", {}
+            ).get("transaction", {}).get("readTimestamp")
+            read_only = {"readTimestamp": timestamp} if timestamp else {"strong": True}
+
+        return first + run_concurrently(
+            [run(read_only, *args) for args in prepared], max_concurrency
+        )
 
     def autocommit(self, value):
         """
@@ -431,32 +1397,221 @@ AND IC.TABLE_SCHEMA = ''
         """
         self._autocommit = value
 
-    def cursor(self):
-        return Cursor(self)
+    def cursor(self, stream_results=False, row_factory=None):
+        """
+            If stream_results is True, SELECTs are streamed and rows are read from
+            the network as they're fetched, rather than all up front.
+
+            row_factory overrides the connection's row_factory for this cursor.
+        """
+        self._check_fork()
+        return Cursor(
+            self, stream_results=stream_results, row_factory=row_factory or self.row_factory
+        )
 
     def close(self):
-        self._destroy_session(self._session)
+        self._check_fork()
         self._session = None
+        self._pool.close()
+
+    def _invalidate_cached_results(self, mutations, schema_operations):
+        if self.result_cache is None:
+            return
+
+        tables = set()
+        for statement in schema_operations:
+            table = table_in_ddl(statement)
+            if table is None:
+                # We can't tell what this affects, so throw everything away
+                self.result_cache.clear()
+                return
+            tables.add(table)
+
+        for mutation in mutations:
+            tables.add(list(mutation.values())[0]["table"])
+
+        self.result_cache.invalidate_tables(tables)
+
+    def pipeline_commits(self, value, max_workers=DEFAULT_PIPELINE_WORKERS):
+        """
+            When enabled, commit() doesn't wait for the :commit call. It returns a
+            CommitFuture and the next transaction can start straight away on another
+            pooled session. Each thread's commits are still sent in order, and if one
+            fails, the commits that thread queued behind it fail too. The error is
+            raised by the next commit() or read in the same thread, and by
+            flush_commits(). Commits from different threads are sent concurrently
+            by up to max_workers background threads.
+
+            Reads wait for the thread's in-flight commits so they always see them.
+        """
+        if not value and self._pipeline is not None:
+            self._pipeline.wait()
+            self.flush_commits()
+
+        self._pipeline = CommitPipeline(max_workers) if value else None
+
+    @property
+    def _commit_chain(self):
+        chain = getattr(self._local, "commit_chain", None)
+        if chain is None:
+            chain = self._local.commit_chain = CommitChain()
+        return chain
+
+    def flush_commits(self):
+        """
+            Waits for this thread's pipelined commits to finish, raising an
+            error if any of them failed
+        """
+        if self._pipeline is not None:
+            self._pipeline.wait(self._commit_chain)
+            self._pipeline.raise_error(self._commit_chain)
+
+    def _wait_for_pending_commit(self):
+        # The chain outlives the thread's transactions, so this still waits
+        # after an empty or read-only commit has started a new one
+        self._pipeline.wait(self._commit_chain)
+        self._pipeline.raise_error(self._commit_chain)
+
+    def _send_commit(self, session, transaction_id, mutations, commit_record=None):
+        """
+            Sends the :commit and returns its response. The commit timestamp
+            is recorded on commit_record (the committing thread's) if given.
+        """
+        if transaction_id:
+            response = self._send_session_request(
+                ENDPOINT_COMMIT, session, {
+                    "transactionId": transaction_id,
+                    "mutations": mutations
+                },
+                recover=False
+            )
+            self._record_commit_timestamp(response)
+        elif mutations:
+            # Nothing was read in this transaction so we never began one. Spanner
+            # can begin and commit a readWrite transaction in the single commit call
+            response = self._commit_mutations(session, mutations)
+        else:
+            return None
+
+        if commit_record is not None:
+            commit_record.update(response.get("commitTimestamp"))
+        return response
 
     def commit(self):
+        self._check_fork()
+        if self._pipeline is not None:
+            self._pipeline.raise_error(self._commit_chain)
+            if not self._schema_operations:
+                return self._commit_pipelined()
+
+            # DDL isn't pipelined, wait for what's in flight and commit normally
+            self.flush_commits()
+
+        mutations = self._transaction_mutations
+        schema_operations = self._schema_operations
+
         # Apply any outstanding schema operations before
         # applying any readWrite transactions
         if self._schema_operations:
-            self._apply_ddl_updates()
+            try:
+                self._apply_ddl_updates()
+            finally:
+                # Some of the statements may have been applied even if we failed
+                self._invalidate_cached_results([], schema_operations)
+
+        # Nothing to commit for a readOnly transaction, we just forget about it
+        if self._transaction_type != "readOnly" and (self._transaction_id or mutations):
+            self._send_commit(
+                self._bind_session(), self._transaction_id, mutations, self._commit_record
+            )
 
-        if not self._transaction_id:
-            return
+        self._invalidate_cached_results(mutations, [])
+        self._end_transaction()
+
+    def _commit_pipelined(self):
+        state = self._state
+        commit_record = self._commit_record
+
+        # The next transaction gets a fresh state (and so a different session)
+        self._local.state = _TransactionState()
 
-        self._send_request(
-            ENDPOINT_COMMIT.format(**self.url_params()), {
-                "transactionId": self._transaction_id,
-                "mutations": self._transaction_mutations
-        })
+        if state.transaction_type == "readOnly" or not (state.transaction_id or state.mutations):
+            if state.session is not None:
+                self._pool.release(state.session)
+            return completed_future()
+
+        def send():
+            session = state.session or self._pool.acquire()
+            try:
+                result = self._send_commit(
+                    session, state.transaction_id, state.mutations, commit_record
+                )
+            finally:
+                self._pool.release(session)
 
+            self._invalidate_cached_results(state.mutations, [])
+            return result
+
+        return self._pipeline.submit(self._commit_chain, send)
+
+    def _commit_mutations(self, session, mutations):
+        """
+            Commits mutations in a single-use readWrite transaction on the given session.
+            If the transaction is aborted nothing was written, so it's safe to try again.
+        """
+        response = self._send_session_request(
+            ENDPOINT_COMMIT, session, {
+                "singleUseTransaction": {"readWrite": {}},
+                "mutations": mutations
+            },
+            retry_statuses=("ABORTED",)
+        )
+        self._record_commit_timestamp(response)
+        return response
+
+    def bulk_import(
+        self, table, columns, rows, mutation="insertOrUpdate", max_workers=DEFAULT_WORKERS,
+        batch_size=None, progress=None, resume_from=0
+    ):
+        """
+            Writes rows (any iterable of sequences matching `columns`) to a table
+            without going through SQL. Rows are committed in batches as large as Spanner
+            allows, by max_workers threads in parallel.
+
+            progress is called with a BulkImportProgress after each batch is committed.
+            If the import fails, a BulkImportError is raised, pass its resume_from
+            back in (with the same rows) to carry on from the last committed batch.
+            The import doesn't take part in the current transaction.
+        """
+        self._check_fork()
+        importer = BulkImporter(
+            self, table, columns, mutation=mutation, max_workers=max_workers,
+            batch_size=batch_size, progress=progress
+        )
+        result = importer.run(rows, resume_from=resume_from)
+
+        if self.result_cache is not None:
+            self.result_cache.invalidate_tables([table])
+
+        return result
+
+    def _end_transaction(self):
         self._transaction_mutations = []
+        self._mutation_count = 0
+        self._mutation_bytes = 0
         self._transaction_id = None
+        self._transaction_type = None
         self._schema_operations = []
+        self._release_session()
 
     def rollback(self):
-        pass
+        self._check_fork()
+        try:
+            if self._transaction_id and self._transaction_type == "readWrite":
+                self._send_request(
+                    ENDPOINT_ROLLBACK.format(**self.url_params()),
+                    {"transactionId": self._transaction_id}
+                )
+        finally:
+            self._end_transaction()
 
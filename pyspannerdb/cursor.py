@@ -1,20 +1,75 @@
 import six
 import string
+import time
 import datetime
-from .parser import QueryType, _determine_query_type
+import itertools
+from collections import deque
+from .parser import (
+    QueryType,
+    _determine_query_type,
+    count_placeholders,
+    replace_placeholders,
+    split_statements
+)
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
+    except ValueError:
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+        except:
+            return value
+
+
+_CONVERTERS = {
+    'INT64': int,
+    'TIMESTAMP': _parse_timestamp,
+}
+
+
+def _param_name(index):
+    # Names go a-z, A-Z, then p52, p53...
+    if index < len(string.ascii_letters):
+        return string.ascii_letters[index]
+    return "p{}".format(index)
+
+
+def _release_as_consumed(rows):
+    """
+        Iterates a list of rows, dropping our reference to each
+        row once it's been handed out
+    """
+    for i in range(len(rows)):
+        row = rows[i]
+        rows[i] = None
+        yield row
 
 
 class Cursor(object):
     arraysize = 100
 
-    def __init__(self, connection):
+    def __init__(self, connection, stream_results=False, row_factory=None):
         self.connection = connection
+        self.stream_results = stream_results
+
+        # See pyspannerdb.rows, if this is None rows are lists
+        self.row_factory = row_factory
         self._last_response = None
-        self._iterator = None
+        self._stream = None
+        self._iterator = iter(())
         self._lastrowid = None
         self.rowcount = -1
         self.description = None
 
+        # (sql, start time, bytes transferred) of a streamed read whose
+        # stats haven't been recorded yet
+        self._streamed_statement = None
+
+        # The results of the remaining statements of a script, see nextset()
+        self._pending_results = deque()
+
     def __enter__(self):
         return self
 
@@ -34,19 +89,17 @@ class Cursor(object):
             types of each parameter to avoid ambiguity (e.g. between bytes and string)
 
             This function takes the sql, and a list of params, and converts
-            "%s" to "@a, "@b" etc. and returns a tuple of (sql, params, types)
+            "?" (or "%s") to "@a, "@b" etc. and returns a tuple of (sql, params, types)
             ready to be send via the REST API
         """
         output_params = {}
         param_types = {}
 
-        for i, val in enumerate(params):
-            letter = string.letters[i]
-            output_params[letter] = val
+        names = [_param_name(i) for i in range(len(params))]
+        sql = replace_placeholders(sql, names)
 
-            # Replace the next %s with a placeholder
-            placeholder = "@{}".format(letter)
-            sql = sql.replace("?", placeholder, 1)
+        for letter, val in zip(names, params):
+            output_params[letter] = val
 
             if isinstance(val, bool):
                 param_types[letter] = {"code": "BOOLEAN"}
@@ -64,59 +117,163 @@ class Cursor(object):
 
 
     def execute(self, sql, params=None):
-        params = params or []
+        # Finish with the previous statement's stream (which records its stats)
+        self._close_stream()
+        self.rowcount = -1
+
+        start = time.time()
+        transferred = self.connection._bytes_transferred
+
+        try:
+            self._execute(sql, params or [])
+        finally:
+            # Statement stats and the slow query log, see Connection.enable_statement_stats().
+            # Streamed reads are recorded once the stream has been read or closed.
+            statement = (sql, start, self.connection._bytes_transferred - transferred)
+            if self._stream is not None:
+                self._streamed_statement = statement
+            else:
+                self._record_statement(statement, max(self.rowcount, 0))
+
+    def _record_statement(self, statement, rows, bytes_received=0):
+        sql, start, transferred = statement
+        self.connection._record_statement(
+            sql, time.time() - start, rows, transferred + bytes_received
+        )
+
+    def _execute(self, sql, params):
+        self._pending_results.clear()
+
+        statements = split_statements(sql)
+        if len(statements) > 1:
+            return self._execute_script(statements, params)
 
         sql, params, types = self._format_query(sql, params)
 
-        self._last_response = self.connection._run_query(sql, params, types)
+        self._set_response(self.connection._run_query(
+            sql, params, types, stream=self.stream_results
+        ))
+
+    def _execute_script(self, statements, params):
+        """
+            Runs several semi-colon separated statements. params holds the
+            parameters of all the statements, in order. The cursor starts
+            on the first statement's result, use nextset() to move on.
+        """
+        queries = []
+        for statement in statements:
+            count = count_placeholders(statement)
+            queries.append(self._format_query(statement, params[:count]))
+            params = params[count:]
+
+        results = self.connection._run_script(queries)
+        self._pending_results.extend(results[1:])
+        self._set_response(results[0])
+
+    def nextset(self):
+        """
+            Moves to the result of the next statement of a script. Returns
+            None if there are no more results.
+        """
+        if not self._pending_results:
+            return None
+
+        self._set_response(self._pending_results.popleft())
+        return True
+
+    def _set_response(self, response):
+        self._close_stream()
+
+        self._last_response = response
         if "_lastrowid" in self._last_response:
             self._lastrowid = self._last_response["_lastrowid"]
 
-        for row in self._last_response.get("rows", []):
-          for i, val in enumerate(row):
-            code = self._last_response['metadata']['rowType']['fields'][i]['type']['code']
-            if row[i] is not None:
-              if code == 'INT64':
-                row[i] = int(row[i])
-              if code == 'TIMESTAMP':
-                try:
-                  row[i] = datetime.datetime.strptime(row[i], "%Y-%m-%dT%H:%M:%S.%fZ")
-                except ValueError:
-                  try:
-                    row[i] = datetime.datetime.strptime(row[i], "%Y-%m-%dT%H:%M:%SZ")
-                  except:
-                    pass
-
-        self._iterator = iter(self._last_response.get("rows", []))
-
-        self.rowcount = len(self._last_response.get("rows", []))
-        if 'metadata' in self._last_response:
+        fields = self._last_response.get('metadata', {}).get('rowType', {}).get('fields')
+        if fields is not None:
             self.description = [
                 (x.get('name'), x['type']['code'], None, None, None, None, None)
-                for x in self._last_response['metadata']['rowType']['fields']
+                for x in fields
             ]
         else:
             self.description = None
 
+        # Rows are converted as they're fetched, not up front
+        converters = [
+            (i, _CONVERTERS[x['type']['code']])
+            for i, x in enumerate(fields or [])
+            if x['type']['code'] in _CONVERTERS
+        ]
+
+        make_row = None
+        if self.row_factory and self.description is not None:
+            make_row = self.row_factory(self.description)
+
+        self._stream = self._last_response.get("_stream")
+        if self._stream is not None:
+            # We won't know how many rows there are until we've read them all
+            self.rowcount = -1
+            rows = self._stream.rows()
+        else:
+            rows = self._last_response.pop("rows", [])
+            self.rowcount = len(rows)
+            rows = _release_as_consumed(rows)
+
+        self._iterator = self._decode_rows(rows, converters, make_row)
+
+    def _decode_rows(self, rows, converters, make_row):
+        for row in rows:
+            for i, convert in converters:
+                if row[i] is not None:
+                    row[i] = convert(row[i])
+            yield make_row(row) if make_row else row
+
+        if self._stream is not None:
+            self.rowcount = self._stream.row_count
+            self._record_streamed_statement()
+
+    def _record_streamed_statement(self):
+        statement = self._streamed_statement
+        if statement is not None:
+            self._streamed_statement = None
+            self._record_statement(statement, self._stream.rows_read, self._stream.bytes_received)
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._record_streamed_statement()
+            self._stream = None
+
     def executemany(self, sql, seq_of_params):
-        pass
+        """
+            Runs sql once for each set of params. In autocommit mode the writes
+            are committed together when they've all run, in as few commits as
+            Spanner's limits allow, rather than one commit per statement.
+        """
+        self._pending_results.clear()
+
+        queries = [self._format_query(sql, params) for params in seq_of_params]
+        if not queries:
+            return
+
+        results = self.connection._run_script(queries)
+        self._set_response(results[-1])
+
+    def __iter__(self):
+        return self._iterator
 
     def fetchone(self):
-        return self._iterator.next()
+        return next(self._iterator, None)
 
     def fetchmany(self, size=None):
-        size = size or Cursor.arraysize
-        results = []
-        for i, result in enumerate(self._iterator):
-            if i == size:
-                return results
-            results.append(result)
-        return results
+        size = size or self.arraysize
+        return list(itertools.islice(self._iterator, size))
 
     def fetchall(self):
         for row in self._iterator:
             yield row
 
     def close(self):
-        pass
+        self._close_stream()
+        self._iterator = iter(())
+        self._pending_results.clear()
 
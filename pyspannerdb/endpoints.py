@@ -6,10 +6,13 @@ ENDPOINT_SESSION_CREATE = (
     ENDPOINT_PREFIX + "projects/{pid}/instances/{iid}/databases/{did}/sessions"
 )
 
+ENDPOINT_SESSION_BATCH_CREATE = ENDPOINT_SESSION_CREATE + ":batchCreate"
+
 ENDPOINT_SQL_EXECUTE = ENDPOINT_SESSION_PREFIX + ":executeSql"
+ENDPOINT_SQL_EXECUTE_STREAMING = ENDPOINT_SESSION_PREFIX + ":executeStreamingSql"
 ENDPOINT_COMMIT = ENDPOINT_SESSION_PREFIX + ":commit"
+ENDPOINT_ROLLBACK = ENDPOINT_SESSION_PREFIX + ":rollback"
 ENDPOINT_UPDATE_DDL = ENDPOINT_PREFIX + "projects/{pid}/instances/{iid}/databases/{did}/ddl"
 ENDPOINT_OPERATION_GET = ENDPOINT_PREFIX + "projects/{pid}/instances/{iid}/databases/{did}/operations/{oid}"
 ENDPOINT_BEGIN_TRANSACTION = ENDPOINT_SESSION_PREFIX + ":beginTransaction"
 ENDPOINT_GET_DDL = ENDPOINT_UPDATE_DDL #Same, just different method
-
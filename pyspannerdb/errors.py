@@ -1,5 +1,18 @@
+import json
+
+import six
+
+
 class Error(Exception):
-    pass
+    # The canonical status (e.g. "ABORTED") and HTTP status code of
+    # the API error this was raised for, if any
+    status = None
+    code = None
+
+    # Whether the operation may succeed if it's tried again, and how
+    # long (in seconds) the server asked us to wait before doing so
+    retryable = False
+    retry_delay = None
 
 
 class DatabaseError(Error):
@@ -14,6 +27,23 @@ class OperationalError(DatabaseError):
     pass
 
 
+class BulkImportError(OperationalError):
+    """
+        Raised by Connection.bulk_import. `resume_from` is the number of
+        batches which are known to have been committed.
+    """
+    resume_from = 0
+    rows_committed = 0
+
+
+class SessionNotFoundError(OperationalError):
+    """
+        The session has been deleted by the server (e.g. because it was
+        idle for too long). Any transaction running on it is lost.
+    """
+    pass
+
+
 class IntegrityError(DatabaseError):
     pass
 
@@ -33,3 +63,102 @@ class NotSupportedError(DatabaseError):
 class InterfaceError(Error):
     pass
 
+
+
+# Maps the canonical status of an API error to the exception raised for it,
+# and whether the request is worth retrying
+_STATUS_ERRORS = {
+    "ABORTED": (OperationalError, True),
+    "UNAVAILABLE": (OperationalError, True),
+    "DEADLINE_EXCEEDED": (OperationalError, True),
+    "RESOURCE_EXHAUSTED": (OperationalError, True),
+    "CANCELLED": (OperationalError, False),
+    "NOT_FOUND": (OperationalError, False),
+    "PERMISSION_DENIED": (OperationalError, False),
+    "UNAUTHENTICATED": (OperationalError, False),
+    "ALREADY_EXISTS": (IntegrityError, False),
+    "FAILED_PRECONDITION": (IntegrityError, False),
+    "INVALID_ARGUMENT": (ProgrammingError, False),
+    "OUT_OF_RANGE": (DataError, False),
+    "INTERNAL": (InternalError, False),
+    "UNIMPLEMENTED": (NotSupportedError, False),
+}
+
+# Used when the response doesn't contain a Google error payload (e.g. it
+# came from a proxy or load balancer)
+_HTTP_STATUSES = {
+    400: "INVALID_ARGUMENT",
+    401: "UNAUTHENTICATED",
+    403: "PERMISSION_DENIED",
+    404: "NOT_FOUND",
+    408: "DEADLINE_EXCEEDED",
+    409: "ABORTED",
+    429: "RESOURCE_EXHAUSTED",
+    501: "UNIMPLEMENTED",
+    502: "UNAVAILABLE",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+RETRY_INFO_TYPE = "type.googleapis.com/google.rpc.RetryInfo"
+
+
+def _parse_duration(duration):
+    # Durations are encoded as a string of seconds, e.g. "1.5s"
+    try:
+        return float(duration.rstrip("s"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _as_text(content):
+    # Bodies come back from read_body() as bytes, a bytearray or a memoryview
+    if isinstance(content, memoryview):
+        content = content.tobytes()
+    elif isinstance(content, bytearray):
+        content = bytes(content)
+
+    if isinstance(content, six.binary_type):
+        content = content.decode("utf-8", "replace")
+    return content or u""
+
+
+def error_from_response(status_code, content, codec=None):
+    """
+        Returns the exception to raise for a non-2xx API response. The Google
+        error payload ({"error": {"code", "status", "message", "details"}}) is
+        used to pick the exception class and fill in status, code, retryable
+        and retry_delay. The body is parsed with codec (see pyspannerdb.codec)
+        if one is given.
+    """
+    content = _as_text(content)
+    loads = codec.loads if codec else json.loads
+
+    try:
+        payload = loads(content).get("error") or {}
+    except (ValueError, TypeError, AttributeError):
+        payload = {}
+
+    if not isinstance(payload, dict):
+        payload = {}
+
+    status = payload.get("status") or _HTTP_STATUSES.get(status_code)
+    if not status and status_code >= 500:
+        status = "INTERNAL"
+
+    error_class, retryable = _STATUS_ERRORS.get(status, (DatabaseError, False))
+    message = payload.get("message") or content
+
+    if status == "NOT_FOUND" and "Session not found" in message:
+        error_class = SessionNotFoundError
+
+    error = error_class("{}: {}".format(status or status_code, message))
+    error.status = status
+    error.code = payload.get("code", status_code)
+    error.retryable = retryable
+
+    for detail in payload.get("details") or []:
+        if detail.get("@type") == RETRY_INFO_TYPE:
+            error.retry_delay = _parse_duration(detail.get("retryDelay"))
+
+    return error
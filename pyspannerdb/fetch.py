@@ -1,6 +1,22 @@
+import socket
+import sys
+
+
 try:
-    from google.appengine.api.urlfetch import fetch
+    from google.appengine.api.urlfetch import fetch, GET, POST, HEAD, PUT, DELETE, PATCH
+    from google.appengine.api.urlfetch_errors import DeadlineExceededError, DownloadError
+
+    # The one place we check whether we're running on App Engine
+    ON_GAE = True
+
+    TIMEOUT_ERRORS = (DeadlineExceededError, socket.timeout)
+    NETWORK_ERRORS = (DownloadError, socket.error)
 except ImportError:
+    ON_GAE = False
+
+    TIMEOUT_ERRORS = (socket.timeout, )
+    NETWORK_ERRORS = (socket.error, )
+
     GET = 'GET'
     POST = 'POST'
     HEAD = 'HEAD'
@@ -8,6 +24,26 @@ except ImportError:
     DELETE = 'DELETE'
     PATCH = 'PATCH'
 
+    # urllib2 openers by debug flag, built on first use. They don't keep
+    # connections open, so they're safe to share between threads and processes
+    _openers = {}
+    urllib2 = None
+
+    def _opener(debug):
+        global urllib2
+
+        opener = _openers.get(debug)
+        if opener is None:
+            # Imported here so that importing pyspannerdb stays cheap
+            import ssl
+            import urllib2
+            import certifi
+
+            context = ssl.create_default_context(cafile=certifi.where())
+            handler = urllib2.HTTPSHandler(debuglevel=1 if debug else 0, context=context)
+            opener = _openers[debug] = urllib2.build_opener(handler)
+        return opener
+
     def fetch(
         url, payload=None, method=1, headers={}, allow_truncated=False,
         follow_redirects=True, deadline=None, validate_certificate=None, debug=False
@@ -17,14 +53,7 @@ except ImportError:
         if not follow_redirects or allow_truncated or validate_certificate:
             raise NotImplementedError()
 
-        import urllib2
-        import certifi
-        import sys
-        if debug:
-          handler = urllib2.HTTPSHandler(debuglevel=1)        
-        else:
-          handler = urllib2.HTTPSHandler()        
-        opener = urllib2.build_opener(handler)
+        opener = _opener(debug)
         if debug:
           print >> sys.stderr, payload
           print >> sys.stderr, headers
@@ -33,6 +62,30 @@ except ImportError:
             request.add_header(k, v)
         request.add_header('Content-Length', len(payload) if payload else 0)
         request.get_method = lambda: method
-        urllib2.install_opener(opener)        
-        return urllib2.urlopen(request, timeout=deadline, cafile=certifi.where())
+        try:
+            return opener.open(request, timeout=deadline)
+        except urllib2.HTTPError as e:
+            # Like urlfetch, non-2xx responses are returned rather than raised
+            return e
+        except urllib2.URLError as e:
+            if isinstance(e.reason, socket.error):
+                raise e.reason
+            raise socket.error(str(e.reason))
+
+
+def is_timeout(exc):
+    if isinstance(exc, TIMEOUT_ERRORS):
+        return True
+
+    # Python 2's ssl module raises SSLError rather than socket.timeout
+    # when a read on a TLS connection times out
+    import ssl
+    return isinstance(exc, ssl.SSLError) and "timed out" in str(exc)
+
 
+def status_code(response):
+    "Returns the HTTP status of either a GAE urlfetch or a urllib2 response"
+    code = getattr(response, "status_code", None)
+    if code is None:
+        code = response.getcode()
+    return code
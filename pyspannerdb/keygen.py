@@ -0,0 +1,115 @@
+"""
+    Primary key generators for INSERTs which don't specify the primary key, see
+    Connection.set_sequence_generator(). A generator is any callable which takes
+    no arguments and returns a new INT64 key.
+
+    Keys are spread across the whole (positive) INT64 range. Sequential keys
+    would make every insert land on the same Spanner split.
+"""
+
+import itertools
+import os
+import random
+import struct
+import threading
+
+
+KEY_BITS = 63  # Positive INT64s only
+
+# Default number of keys BlockKeyGenerator reserves at a time
+DEFAULT_BLOCK_SIZE = 1024
+
+# Bits of a bit-reversed key which identify the process that generated it
+NODE_BITS = 24
+
+
+def _random_keys(count):
+    # os.urandom is safe to call from any thread and doesn't need seeding
+    # (even after a fork), unlike the random module
+    values = struct.unpack(">{}Q".format(count), os.urandom(8 * count))
+    return [(value >> 1) or 1 for value in values]
+
+
+def random_key():
+    """
+        Returns a random positive INT64, built from 63 bits of os.urandom (the
+        same source as uuid.uuid4). The chance of two keys colliding is the same
+        as for the low 63 bits of two random UUIDs.
+    """
+    return _random_keys(1)[0]
+
+
+def _reverse_bits(value, bits=KEY_BITS):
+    return int(format(value, "0{}b".format(bits))[::-1], 2)
+
+
+class BitReversedSequence(object):
+    """
+        A counter whose bits are reversed before it's returned, so consecutive
+        values are as far apart as possible in the key space. The lowest bits of
+        each key are a random node id for this generator, so generators in
+        different processes don't produce the same keys (unless they happen to
+        pick the same node id).
+    """
+
+    def __init__(self, start=1, node_id=None):
+        self._random_node_id = node_id is None
+        if node_id is None:
+            node_id = random.SystemRandom().getrandbits(NODE_BITS)
+
+        self.node_id = node_id
+
+        # next() on itertools.count is atomic, so no lock is needed
+        self._counter = itertools.count(start)
+
+    def __call__(self):
+        # The node id goes in the top bits, so after reversing the lowest
+        # (fastest changing) bit of the counter is the highest bit of the key
+        counter = next(self._counter) & ((1 << (KEY_BITS - NODE_BITS)) - 1)
+        value = (self.node_id << (KEY_BITS - NODE_BITS)) | counter
+        return _reverse_bits(value) or 1
+
+    def reset(self):
+        """
+            Called in a forked child, which would otherwise generate the same
+            keys as its parent. Picks a new node id (unless one was given).
+        """
+        if self._random_node_id:
+            self.node_id = random.SystemRandom().getrandbits(NODE_BITS)
+
+
+class BlockKeyGenerator(object):
+    """
+        Hands out keys from blocks of `block_size` keys, so the cost of generating
+        keys (e.g. a call to os.urandom, or reserving a range in a counter table)
+        is paid once per block. reserve(count) must return `count` unique keys.
+
+        Only refilling the block takes a lock, handing out a key doesn't.
+    """
+
+    def __init__(self, reserve=_random_keys, block_size=DEFAULT_BLOCK_SIZE):
+        self.reserve = reserve
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._block = iter(())
+
+    def __call__(self):
+        while True:
+            block = self._block
+            try:
+                # next() on a list iterator is atomic
+                return next(block)
+            except StopIteration:
+                pass
+
+            with self._lock:
+                if self._block is block:
+                    self._block = iter(self.reserve(self.block_size))
+
+    def reset(self):
+        """
+            Throws away the current block. Called in a forked child, which
+            would otherwise hand out the same keys as its parent.
+        """
+        self._lock = threading.Lock()
+        self._block = iter(())
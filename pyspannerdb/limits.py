@@ -0,0 +1,43 @@
+"""
+    Cloud Spanner's limits on the size of a single commit
+"""
+
+import six
+
+# Each inserted or updated column value counts as one mutation, as does
+# each deleted key or key range
+MAX_MUTATIONS_PER_COMMIT = 20000
+
+# Maximum size of a commit request
+MAX_COMMIT_SIZE_BYTES = 100 * 1024 * 1024
+
+
+def estimate_size(value):
+    """
+        A cheap estimate of the size of a value once it's encoded as JSON,
+        without actually encoding it
+    """
+    if isinstance(value, dict):
+        return 2 + sum(len(key) + 4 + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        return 2 + sum(estimate_size(item) + 1 for item in value)
+    elif isinstance(value, six.string_types + (six.binary_type, )):
+        return len(value) + 2
+    return 8
+
+
+def mutation_size(mutation):
+    """
+        Returns the number of mutations a commit mutation counts as towards
+        MAX_MUTATIONS_PER_COMMIT, and an estimate of its size in bytes
+    """
+    (kind, body), = mutation.items()
+    if kind == "delete":
+        key_set = body["keySet"]
+        count = len(key_set.get("keys", [])) + len(key_set.get("ranges", []))
+        if key_set.get("all"):
+            count += 1
+    else:
+        count = len(body["columns"]) * len(body["values"])
+
+    return count, estimate_size(mutation)
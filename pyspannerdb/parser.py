@@ -1,6 +1,6 @@
 import base64
 import datetime
-from pytz import utc
+import re
 import six
 
 from .errors import NotSupportedError
@@ -31,6 +31,18 @@ class ParsedSQLInfo(object):
             self.row_values.append(values)
 
 
+_UTC = None
+
+
+def _utc():
+    # pytz is only imported once we actually see a timezone-aware datetime
+    global _UTC
+    if _UTC is None:
+        from pytz import utc
+        _UTC = utc
+    return _UTC
+
+
 def _convert_for_json(values):
     """
         Cloud Spanner has a slightly bizarre system for sending different
@@ -47,26 +59,82 @@ def _convert_for_json(values):
             values[i] = base64.b64encode(value) # Bytes must be b64 encoded
         elif isinstance(value, datetime.datetime):
             # datetimes must send the Zulu (UTC) timezone...
-            if value.tzinfo:
-                value = value.astimezone(utc)
-            values[i] = value.isoformat("T") + "Z"
+            values[i] = _timestamp_to_json(value)
         elif isinstance(value, datetime.date):
             values[i] = value.isoformat()
     return values
 
 
+def _timestamp_to_json(value):
+    if value.tzinfo:
+        value = value.astimezone(_utc()).replace(tzinfo=None)
+    return value.isoformat("T") + "Z"
+
+
+def _float_to_json(value):
+    value = float(value)
+    if value != value:
+        return "NaN"
+    elif value == float("inf"):
+        return "Infinity"
+    elif value == float("-inf"):
+        return "-Infinity"
+    return value
+
+
+def _bytes_to_json(value):
+    if isinstance(value, six.text_type):
+        value = value.encode("utf-8")
+    return base64.b64encode(value).decode("ascii")
+
+
+def _string_to_json(value):
+    if isinstance(value, six.binary_type):
+        return value.decode("utf-8")
+    return value
+
+
+_JSON_CONVERTERS = {
+    "INT64": six.text_type,  # Ints must be strings
+    "FLOAT64": _float_to_json,
+    "BOOL": bool,
+    "STRING": _string_to_json,
+    "BYTES": _bytes_to_json,
+    "DATE": lambda value: value.isoformat(),
+    "TIMESTAMP": _timestamp_to_json,
+}
+
+
+def json_converter_for_type(spanner_type):
+    """
+        Returns a function which converts a Python value to JSON for a column of
+        the given type, as it appears in information_schema (e.g. "STRING(MAX)" or
+        "ARRAY<INT64>"). Unlike _convert_for_json this doesn't need to inspect the
+        type of each value, so it's much cheaper for bulk data.
+    """
+    spanner_type = spanner_type.strip().upper()
+
+    if spanner_type.startswith("ARRAY<"):
+        convert_item = json_converter_for_type(spanner_type[len("ARRAY<"):-1])
+        return lambda values: [
+            None if value is None else convert_item(value) for value in values
+        ]
+
+    base_type = spanner_type.split("(")[0]
+    try:
+        return _JSON_CONVERTERS[base_type]
+    except KeyError:
+        raise NotSupportedError("Unsupported column type: {}".format(spanner_type))
+
+
 def _determine_query_type(sql):
-    if sql.upper().startswith("SHOW DDL"):
-        # Special case for our custom SHOW DDL command
+    if sql.lstrip().upper().startswith("SHOW "):
+        # Special case for our custom SHOW commands
         return QueryType.CUSTOM
 
     if sql.upper().startswith("START TRANSACTION"):
         return QueryType.CUSTOM
 
-    if sql.upper().startswith("SHOW INDEX"):
-        # Special case
-        return QueryType.CUSTOM
-
     if sql.strip().split()[0].upper() == "SELECT":
         return QueryType.READ
 
@@ -81,6 +149,188 @@ def _determine_query_type(sql):
     return QueryType.READ
 
 
+# Splits SQL into strings (including triple-quoted and escaped ones), quoted
+# identifiers, comments, parameter placeholders, semi-colons and everything else
+_TOKEN_REGEX = re.compile(
+    r"(?P<string>"
+    r"'''(?:\\.|[^\\])*?'''|"
+    r'"""(?:\\.|[^\\])*?"""|'
+    r"'(?:\\.|[^'\\])*'|"
+    r'"(?:\\.|[^"\\])*"|'
+    r"`[^`]*`)"
+    r"|(?P<comment>--[^\n]*|#[^\n]*|/\*.*?\*/)"
+    r"|(?P<placeholder>\?|%s)"
+    r"|(?P<semicolon>;)"
+    r"|(?P<other>[^'\"`#;?%/-]+|.)",
+    re.DOTALL
+)
+
+
+def tokenize_sql(sql):
+    """
+        Yields (token_type, text) for each token in sql, where token_type is
+        one of "string", "comment", "placeholder", "semicolon" or "other"
+    """
+    for match in _TOKEN_REGEX.finditer(sql):
+        yield match.lastgroup, match.group()
+
+
+def split_statements(sql):
+    """
+        Splits a script on the semi-colons which aren't in strings or comments.
+        Comments are removed, and empty statements are skipped.
+    """
+    statements = []
+    current = []
+    for token_type, text in tokenize_sql(sql):
+        if token_type == "semicolon":
+            statements.append("".join(current).strip())
+            current = []
+        elif token_type != "comment":
+            current.append(text)
+
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+# Numbers and named parameters (e.g. @id) which fingerprint_sql() replaces
+_LITERAL_REGEX = re.compile(
+    r"\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\b|@\w+"
+)
+_VALUE_LIST_REGEX = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROW_LIST_REGEX = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+def fingerprint_sql(sql):
+    """
+        Returns sql with its literals, parameters and comments removed so that
+        every execution of a statement has the same fingerprint, whatever the
+        values. Lists of values (e.g. for IN or multi-row INSERTs) collapse to
+        one, so "SELECT * FROM t WHERE id IN (1, 2) AND name = 'x'" becomes
+        "SELECT * FROM t WHERE id IN (?) AND name = ?"
+    """
+    parts = []
+    for token_type, text in tokenize_sql(sql):
+        if token_type == "placeholder" or (token_type == "string" and not text.startswith("`")):
+            parts.append("?")
+        elif token_type == "other":
+            parts.append(_LITERAL_REGEX.sub("?", text))
+        elif token_type == "comment":
+            parts.append(" ")
+        else:
+            parts.append(text)
+
+    fingerprint = _VALUE_LIST_REGEX.sub("(?)", normalize_sql("".join(parts)))
+    return _ROW_LIST_REGEX.sub("(?)", fingerprint)
+
+
+def count_placeholders(sql):
+    return sum(1 for token_type, text in tokenize_sql(sql) if token_type == "placeholder")
+
+
+def replace_placeholders(sql, names):
+    """
+        Replaces the first len(names) ? (or %s) placeholders in sql
+        with named parameters, e.g. @a
+    """
+    names = iter(names)
+    output = []
+    for token_type, text in tokenize_sql(sql):
+        if token_type == "placeholder":
+            text = next((u"@{}".format(name) for name in names), text)
+        output.append(text)
+    return "".join(output)
+
+
+_WHITESPACE_REGEX = re.compile(r"\s+")
+
+_QUERY_TABLES_REGEX = re.compile(
+    r"\b(?:FROM|JOIN)\s+`?([A-Za-z_][A-Za-z0-9_.]*)`?", re.IGNORECASE
+)
+
+_FROM_REGEX = re.compile(r"\bFROM\b", re.IGNORECASE)
+
+# Brackets, commas and the keywords which end a FROM clause
+_FROM_CLAUSE_TOKEN_REGEX = re.compile(
+    r"\b(?:WHERE|GROUP|ORDER|LIMIT|HAVING|UNION|INTERSECT|EXCEPT|WINDOW)\b|[(),]",
+    re.IGNORECASE
+)
+
+_DDL_TABLE_REGEX = re.compile(
+    r"^\s*(?:CREATE|ALTER|DROP)\s+TABLE\s+`?([A-Za-z0-9_-]+)`?|"
+    r"^\s*CREATE\s+(?:UNIQUE\s+)?(?:NULL_FILTERED\s+)?INDEX\s+\S+\s+ON\s+`?([A-Za-z0-9_-]+)`?",
+    re.IGNORECASE
+)
+
+
+def normalize_sql(sql):
+    """
+        Collapses whitespace (outside of string literals) and removes comments
+        so that the same statement formatted differently gives the same string
+    """
+    parts = []
+    space = False  # Whether the output ends with whitespace we've collapsed
+    for token_type, text in tokenize_sql(sql):
+        if token_type == "string":
+            parts.append(text)
+            space = False
+            continue
+
+        text = " " if token_type == "comment" else _WHITESPACE_REGEX.sub(" ", text)
+        if space and text.startswith(" "):
+            text = text[1:]
+        if text:
+            parts.append(text)
+            space = text.endswith(" ")
+    return "".join(parts).strip()
+
+
+def _has_comma_join(sql):
+    # True if any FROM clause lists tables separated by commas
+    for match in _FROM_REGEX.finditer(sql):
+        depth = 0
+        for token in _FROM_CLAUSE_TOKEN_REGEX.finditer(sql, match.end()):
+            text = token.group()
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0:
+                if text == ",":
+                    return True
+                break
+    return False
+
+
+def tables_in_query(sql):
+    """
+        Returns the set of tables a SELECT statement reads from, or an empty
+        set if we can't be sure which they are (e.g. "FROM a, b")
+    """
+    # Quoted strings can't name tables, but backticked identifiers can
+    sql = "".join(
+        "''" if token_type == "string" and not text.startswith("`") else text
+        for token_type, text in tokenize_sql(sql)
+        if token_type != "comment"
+    )
+    if _has_comma_join(sql):
+        return set()
+    return set(_QUERY_TABLES_REGEX.findall(sql))
+
+
+def table_in_ddl(statement):
+    """
+        Returns the table affected by a DDL statement, or None if we
+        can't tell (e.g. DROP INDEX)
+    """
+    match = _DDL_TABLE_REGEX.match(statement)
+    if not match:
+        return None
+    return match.group(1) or match.group(2)
+
+
 def parse_sql(sql, params):
     """
         Parses a restrictive subset of SQL for "write" queries (INSERT, UPDATE etc.)
@@ -0,0 +1,187 @@
+"""
+    Pipelined commits. Rather than blocking on each :commit call, Connection.commit()
+    hands the commit to a background thread and returns a CommitFuture so the caller
+    can start building the next transaction straight away.
+"""
+
+import sys
+import threading
+
+from collections import deque
+
+import six
+from six.moves import queue
+
+
+# Number of threads sending pipelined commits
+DEFAULT_WORKERS = 4
+
+
+class CommitFuture(object):
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+        return self.done()
+
+    def result(self, timeout=None):
+        """
+            Returns the :commit response, or raises the error that the
+            commit (or an earlier commit that it depended on) failed with
+        """
+        if not self.wait(timeout):
+            raise RuntimeError("Timed out waiting for the commit to finish")
+
+        if self._error:
+            six.reraise(*self._error)
+        return self._result
+
+    def exception(self, timeout=None):
+        self.wait(timeout)
+        return self._error[1] if self._error else None
+
+    def _set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def _set_error(self, error):
+        self._error = error
+        self._event.set()
+
+
+def completed_future(result=None):
+    future = CommitFuture()
+    future._set_result(result)
+    return future
+
+
+class CommitChain(object):
+    """
+        The pipelined commits of one thread. They're sent one at a time in
+        the order they were made, as each may depend on the ones before it.
+    """
+
+    def __init__(self):
+        self.last_future = None
+
+        # Commits waiting for the one in flight to finish
+        self._pending = deque()
+        self._running = False
+
+        # The error that commits queued behind a failed commit fail with
+        self._error = None
+        self._unreported_error = None
+
+
+class CommitPipeline(object):
+    """
+        Runs pipelined commits on a small pool of background threads. Commits in
+        the same CommitChain are sent in the order they were submitted, but
+        commits from different chains (i.e. different threads' transactions, on
+        different sessions) are sent concurrently.
+
+        If a commit fails, the commits queued behind it in its chain fail with the
+        same error without being sent, as they may have depended on the failed one.
+        The error is also raised (once) by raise_error() for that chain. Other
+        chains aren't affected.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._queue = queue.Queue()
+        self._condition = threading.Condition(threading.Lock())
+        self._threads = []
+        self._outstanding = 0
+
+    def submit(self, chain, func):
+        future = CommitFuture()
+
+        with self._condition:
+            self._outstanding += 1
+            chain.last_future = future
+            if chain._running:
+                chain._pending.append((func, future))
+                return future
+
+            chain._running = True
+            self._start_worker()
+
+        self._queue.put((chain, func, future))
+        return future
+
+    def _start_worker(self):
+        # Called with the lock held, threads are started as they're needed
+        if len(self._threads) >= self.max_workers:
+            return
+
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            chain, func, future = self._queue.get()
+            with self._condition:
+                error = chain._error
+
+            if error:
+                future._set_error(error)
+            else:
+                try:
+                    future._set_result(func())
+                except Exception:
+                    error = sys.exc_info()
+                    with self._condition:
+                        if chain._unreported_error is None:
+                            chain._unreported_error = error
+                    future._set_error(error)
+
+            next_item = None
+            with self._condition:
+                self._outstanding -= 1
+                if chain._pending:
+                    # Commits after a failure fail too, but once the chain has
+                    # drained new commits no longer depend on the failed one
+                    chain._error = error
+                    func, future = chain._pending.popleft()
+                    next_item = (chain, func, future)
+                else:
+                    chain._error = None
+                    chain._running = False
+                self._condition.notify_all()
+
+            if next_item:
+                self._queue.put(next_item)
+
+    def wait(self, chain=None):
+        """
+            Blocks until everything submitted so far to `chain` (or to any
+            chain, if it's None) has been committed
+        """
+        if chain is not None:
+            future = chain.last_future
+            if future is not None:
+                future.wait()
+            return
+
+        with self._condition:
+            while self._outstanding:
+                self._condition.wait()
+
+    def raise_error(self, chain):
+        """
+            Raises the first error from a failed commit in the chain
+            that hasn't been reported yet
+        """
+        with self._condition:
+            error, chain._unreported_error = chain._unreported_error, None
+
+        if error:
+            six.reraise(*error)
@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+
+from .errors import SessionNotFoundError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Default upper limit on the number of sessions a single Connection will create
+DEFAULT_MAX_SESSIONS = 100
+
+# Spanner deletes sessions which have been idle for an hour, so we ping
+# sessions which have been idle for longer than this
+KEEP_ALIVE_AFTER = 50 * 60
+
+# How often (in seconds) the keep-alive thread looks for idle sessions
+KEEP_ALIVE_CHECK_INTERVAL = 60
+
+
+class SessionPool(object):
+    """
+        The set of Spanner sessions used by a Connection. A session can only run
+        one transaction at a time, so each thread checks a session out for the
+        duration of its transaction and returns it when the transaction ends.
+
+        When fewer than min_available sessions are left after an acquire(), more
+        are created in the background so that callers rarely have to wait for
+        a session to be created.
+    """
+
+    def __init__(
+        self, create_session, destroy_session, max_size=DEFAULT_MAX_SESSIONS,
+        batch_create_sessions=None, min_available=0
+    ):
+        self._create_session = create_session
+        self._destroy_session = destroy_session
+        self._batch_create_sessions = batch_create_sessions
+        self.max_size = max_size
+        self.min_available = min_available
+
+        self._condition = threading.Condition(threading.Lock())
+        self._available = []
+        self._in_use = set()
+        self._last_used = {}
+
+        # Sessions we're creating right now, these count towards max_size
+        self._pending = 0
+
+        self._keep_alive_thread = None
+        self._closed = threading.Event()
+
+    @property
+    def size(self):
+        with self._condition:
+            return len(self._available) + len(self._in_use) + self._pending
+
+    def _add_sessions(self, count):
+        """
+            Creates `count` sessions (which must already be counted in _pending)
+            and makes them available
+        """
+        sessions = []
+        try:
+            if count > 1 and self._batch_create_sessions:
+                sessions = self._batch_create_sessions(count)
+            else:
+                for i in range(count):
+                    sessions.append(self._create_session())
+        finally:
+            with self._condition:
+                self._pending -= count
+                now = time.time()
+                for session in sessions:
+                    self._available.append(session)
+                    self._last_used[session] = now
+                self._condition.notify_all()
+
+    def _replenish(self, count):
+        try:
+            self._add_sessions(count)
+        except Exception:
+            logger.warning("Unable to create sessions in the background", exc_info=True)
+
+    def _reserve(self, count):
+        # Counts the sessions needed to bring the pool up to `count` as pending
+        with self._condition:
+            missing = count - (len(self._available) + len(self._in_use) + self._pending)
+            missing = max(min(missing, self.max_size - len(self._in_use) - self._pending), 0)
+            self._pending += missing
+        return missing
+
+    def warm(self, count):
+        """
+            Makes sure there are at least `count` sessions in the pool
+        """
+        missing = self._reserve(count)
+        if missing:
+            self._add_sessions(missing)
+
+    def warm_async(self, count):
+        """
+            Like warm(), but the sessions are created on a background thread
+            (with a single batchCreate call) and this returns immediately.
+            Callers which need a session before they're ready will create one
+            themselves rather than waiting.
+        """
+        missing = self._reserve(count)
+        if missing:
+            self._start_replenish(missing)
+
+    def _start_replenish(self, count):
+        thread = threading.Thread(target=self._replenish, args=(count,))
+        thread.daemon = True
+        thread.start()
+
+    def acquire(self):
+        replenish = 0
+        with self._condition:
+            while True:
+                if self._available:
+                    # Most recently used first, it's the least likely to have expired
+                    session = self._available.pop()
+                    self._in_use.add(session)
+
+                    replenish = max(min(
+                        self.min_available - len(self._available) - self._pending,
+                        self.max_size - len(self._available) - len(self._in_use) - self._pending
+                    ), 0)
+                    self._pending += replenish
+                    break
+
+                if len(self._in_use) + self._pending < self.max_size:
+                    self._pending += 1
+                    session = None
+                    break
+
+                self._condition.wait()
+
+        if replenish:
+            self._start_replenish(replenish)
+
+        if session is not None:
+            return session
+
+        try:
+            session = self._create_session()
+        finally:
+            with self._condition:
+                self._pending -= 1
+                if session:
+                    self._in_use.add(session)
+                else:
+                    self._condition.notify()
+
+        return session
+
+    def release(self, session):
+        with self._condition:
+            if session not in self._in_use:
+                # Discarded while it was checked out
+                return
+
+            self._in_use.discard(session)
+            self._available.append(session)
+            self._last_used[session] = time.time()
+            self._condition.notify()
+
+    def discard(self, session):
+        """
+            Removes a session that is no longer usable (e.g. it has been deleted
+            on the server) from the pool
+        """
+        with self._condition:
+            self._in_use.discard(session)
+            self._last_used.pop(session, None)
+            if session in self._available:
+                self._available.remove(session)
+            self._condition.notify()
+
+    def keep_alive(self, ping, idle_time=KEEP_ALIVE_AFTER):
+        """
+            Calls ping(session) for each available session which hasn't been used
+            for idle_time seconds so that Spanner doesn't delete it. Sessions which
+            have already been deleted are discarded.
+        """
+        now = time.time()
+        with self._condition:
+            idle = [
+                session for session in self._available
+                if now - self._last_used.get(session, now) >= idle_time
+            ]
+            for session in idle:
+                self._available.remove(session)
+                self._in_use.add(session)
+
+        for session in idle:
+            try:
+                ping(session)
+            except SessionNotFoundError:
+                self.discard(session)
+                continue
+            except Exception:
+                logger.warning("Unable to ping session %s", session, exc_info=True)
+
+            self.release(session)
+
+    def start_keep_alive(self, ping, interval=KEEP_ALIVE_CHECK_INTERVAL, idle_time=KEEP_ALIVE_AFTER):
+        """
+            Runs keep_alive() every `interval` seconds on a background thread
+            until the pool is closed
+        """
+        def run():
+            try:
+                while not self._closed.wait(interval):
+                    self.keep_alive(ping, idle_time)
+            except Exception:
+                # Daemon threads can wake up while the interpreter is
+                # shutting down and module globals have been cleared
+                return
+
+        with self._condition:
+            if self._keep_alive_thread is not None:
+                return
+
+            self._keep_alive_thread = threading.Thread(target=run)
+            self._keep_alive_thread.daemon = True
+            self._keep_alive_thread.start()
+
+    def close(self):
+        self._closed.set()
+
+        with self._condition:
+            sessions = self._available + list(self._in_use)
+            self._available = []
+            self._in_use = set()
+            self._last_used = {}
+
+        for session in sessions:
+            self._destroy_session(session)
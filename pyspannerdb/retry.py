@@ -0,0 +1,150 @@
+"""
+    Deadlines, retries and hedged requests for calls to the Spanner API
+"""
+
+import random
+import sys
+import threading
+import time
+
+from collections import deque
+
+import six
+from six.moves import queue
+
+
+# Default per-attempt timeout in seconds for each kind of RPC. The key is the
+# method at the end of the URL (e.g. ":commit") or the collection for
+# plain REST calls (e.g. "sessions")
+DEFAULT_TIMEOUT_POLICY = {
+    "executeSql": 60,
+    "executeStreamingSql": 300,
+    "commit": 60,
+    "rollback": 30,
+    "beginTransaction": 30,
+    "sessions": 30,
+    "ddl": 60,
+    "operations": 30,
+}
+
+DEFAULT_TIMEOUT = 60
+
+DEFAULT_MAX_RETRIES = 3
+
+# Backoff between retries is BACKOFF_BASE * 2 ** attempt (with jitter) up to BACKOFF_MAX
+BACKOFF_BASE = 0.1
+BACKOFF_MAX = 5.0
+
+# How long to wait before hedging a read until we've seen enough reads
+# to estimate the latency percentile
+DEFAULT_HEDGE_DELAY = 1.0
+
+
+def rpc_name(url):
+    """
+        Returns the name of the RPC a URL is for, e.g. "commit" for
+        .../sessions/abc:commit and "operations" for .../operations/xyz
+    """
+    path = url.split("?")[0].rstrip("/")
+    last = path.rsplit("/", 1)[-1]
+    if ":" in last:
+        return last.rsplit(":", 1)[-1]
+
+    parts = path.split("/")
+    for name in ("operations", "sessions", "ddl"):
+        if name in parts:
+            return name
+    return None
+
+
+def backoff_delay(attempt):
+    delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Deadline(object):
+    """
+        An absolute point in time that a whole operation (including
+        any retries) must finish by
+    """
+
+    def __init__(self, timeout):
+        self.expires_at = time.time() + timeout
+
+    def remaining(self):
+        return self.expires_at - time.time()
+
+
+class LatencyTracker(object):
+    """
+        Keeps the most recent request latencies so we can estimate percentiles
+    """
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percent, default=None):
+        with self._lock:
+            samples = sorted(self._samples)
+
+        if not samples:
+            return default
+
+        index = min(int(len(samples) * percent / 100.0), len(samples) - 1)
+        return samples[index]
+
+
+def hedged_call(func, delay, max_attempts=2):
+    """
+        Calls func() in a background thread. If it hasn't returned after `delay`
+        seconds, func() is called again in parallel (up to max_attempts times in
+        total). The first successful result is returned, and if every attempt
+        fails the first error is raised. func must be safe to call concurrently.
+    """
+    results = queue.Queue()
+
+    def attempt():
+        try:
+            results.put((True, func()))
+        except Exception:
+            results.put((False, sys.exc_info()))
+
+    def start():
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+
+    start()
+    started = 1
+    finished = 0
+    first_error = None
+
+    while True:
+        try:
+            if started < max_attempts and finished == started - 1:
+                ok, value = results.get(timeout=delay)
+            else:
+                ok, value = results.get()
+        except queue.Empty:
+            # Too slow, send another attempt
+            start()
+            started += 1
+            continue
+
+        finished += 1
+        if ok:
+            return value
+
+        first_error = first_error or value
+        if finished == started:
+            if started < max_attempts:
+                # Don't wait for the hedge delay after a failure
+                start()
+                started += 1
+            else:
+                six.reraise(*first_error)
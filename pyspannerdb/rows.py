@@ -0,0 +1,100 @@
+"""
+    Row factories for cursors. A row factory is called once per result set with
+    the cursor's description, and returns a callable which turns the list of
+    values for each row into the row object handed back by fetchone() etc.
+
+    By default (no row factory) rows are plain lists.
+"""
+
+import six
+
+
+# Once a result set has this many distinct values in its string
+# columns we stop interning, the values probably aren't repetitive
+MAX_INTERNED_STRINGS = 10000
+
+
+def tuple_row_factory(description):
+    return tuple
+
+
+def dict_row_factory(description):
+    names = [column[0] for column in description]
+    return lambda values: dict(zip(names, values))
+
+
+class Row(tuple):
+    """
+        A compact, immutable row. Values can be accessed by position, by column
+        name (row["name"]) or as attributes (row.name). The column index is
+        shared by every row in the result set, so rows cost no more than a tuple.
+    """
+    __slots__ = ()
+
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, six.string_types):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def keys(self):
+        return list(self._fields)
+
+    def as_dict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        return "Row({})".format(", ".join(
+            "{}={!r}".format(name, value) for name, value in zip(self._fields, self)
+        ))
+
+
+def _string_interner(string_columns):
+    strings = {}
+
+    def intern_strings(values):
+        for i in string_columns:
+            value = values[i]
+            if value is None:
+                continue
+
+            existing = strings.get(value)
+            if existing is not None:
+                values[i] = existing
+            elif len(strings) < MAX_INTERNED_STRINGS:
+                strings[value] = value
+        return values
+
+    return intern_strings
+
+
+def row_factory(description, intern_strings=True):
+    """
+        Returns Row objects which share one column index for the result set. If
+        intern_strings is True, repeated values in STRING columns share a single
+        string object rather than each row keeping its own copy.
+    """
+    fields = tuple(column[0] for column in description)
+    row_class = type("Row", (Row,), {
+        "__slots__": (),
+        "_fields": fields,
+        "_index": dict((name, i) for i, name in enumerate(fields)),
+    })
+
+    string_columns = [
+        i for i, column in enumerate(description) if column[1] == "STRING"
+    ]
+
+    if intern_strings and string_columns:
+        interner = _string_interner(string_columns)
+        return lambda values: row_class(interner(values))
+
+    return row_class
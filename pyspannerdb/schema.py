@@ -0,0 +1,289 @@
+"""
+    An in-memory model of the database schema, parsed from the DDL statements
+    returned by a single GET of the database's DDL. This backs the custom SHOW
+    statements and the primary key and column type lookups, so introspecting
+    lots of tables doesn't cost a request per table.
+"""
+
+import hashlib
+import re
+
+
+# How long (in seconds) the schema is used before we check whether
+# it has been changed by another process
+DEFAULT_SCHEMA_TTL = 300
+
+
+_CREATE_TABLE_REGEX = re.compile(
+    r"^\s*CREATE\s+TABLE\s+`?(?P<name>\w+)`?\s*\((?P<body>.*)\)\s*"
+    r"PRIMARY\s+KEY\s*\((?P<key>[^)]*)\)(?P<rest>.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+
+_INTERLEAVE_REGEX = re.compile(
+    r"INTERLEAVE\s+IN\s+PARENT\s+`?(?P<parent>\w+)`?"
+    r"(?:\s+ON\s+DELETE\s+(?P<on_delete>CASCADE|NO\s+ACTION))?",
+    re.IGNORECASE
+)
+
+_CREATE_INDEX_REGEX = re.compile(
+    r"^\s*CREATE\s+(?P<unique>UNIQUE\s+)?(?P<null_filtered>NULL_FILTERED\s+)?INDEX\s+"
+    r"`?(?P<name>\w+)`?\s+ON\s+`?(?P<table>\w+)`?\s*\((?P<columns>[^)]*)\)(?P<rest>.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+
+_STORING_REGEX = re.compile(r"STORING\s*\((?P<columns>[^)]*)\)", re.IGNORECASE)
+_INDEX_INTERLEAVE_REGEX = re.compile(r"INTERLEAVE\s+IN\s+`?(?P<parent>\w+)`?", re.IGNORECASE)
+
+# Table elements which aren't columns
+_CONSTRAINT_PREFIXES = ("CONSTRAINT", "FOREIGN", "CHECK", "ROW DELETION")
+
+
+class Column(object):
+    def __init__(self, name, spanner_type, nullable=True):
+        self.name = name
+        self.spanner_type = spanner_type
+        self.nullable = nullable
+
+    def __repr__(self):
+        return "<Column {} {}>".format(self.name, self.spanner_type)
+
+
+class Index(object):
+    def __init__(
+        self, name, table, columns, unique=False, null_filtered=False, storing=None,
+        parent=None
+    ):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.null_filtered = null_filtered
+        self.storing = storing or []
+        self.parent = parent
+
+    def __repr__(self):
+        return "<Index {} ON {}>".format(self.name, self.table)
+
+
+class Table(object):
+    def __init__(self, name, columns, primary_key, parent=None, on_delete=None):
+        self.name = name
+        self.columns = columns
+        self.primary_key = primary_key
+        self.parent = parent
+        self.on_delete = on_delete
+        self.indexes = []
+
+    def column(self, name):
+        for column in self.columns:
+            if column.name == name:
+                return column
+        return None
+
+    def __repr__(self):
+        return "<Table {}>".format(self.name)
+
+
+class Schema(object):
+    def __init__(self, statements):
+        self.statements = list(statements)
+        self.digest = ddl_digest(self.statements)
+
+        self.tables = {}
+        self.indexes = {}
+        self._ddl = {}
+
+        for statement in self.statements:
+            obj = _parse_statement(statement)
+            if isinstance(obj, Table):
+                self.tables[obj.name] = obj
+            elif isinstance(obj, Index):
+                self.indexes[obj.name] = obj
+            else:
+                continue
+            self._ddl[obj.name] = statement
+
+        for index in self.indexes.values():
+            if index.table in self.tables:
+                self.tables[index.table].indexes.append(index)
+
+    def ddl(self, name=None):
+        """
+            Returns the CREATE statement for a table or index, or all
+            the statements if no name is given
+        """
+        if name is None:
+            return list(self.statements)
+        return [self._ddl[name]] if name in self._ddl else []
+
+
+def ddl_digest(statements):
+    return hashlib.sha1(u"\n".join(statements).encode("utf-8")).hexdigest()
+
+
+def _split_top_level(text):
+    """
+        Splits on commas which aren't inside brackets or quotes
+    """
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote and text[i - 1] != "\\":
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char in "(<":
+            depth += 1
+        elif char in ")>":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _key_columns(text):
+    # "SingerId DESC, AlbumId" -> ["SingerId", "AlbumId"]
+    return [part.split()[0].strip("`") for part in _split_top_level(text)]
+
+
+def _parse_column(definition):
+    name, rest = definition.split(None, 1)
+
+    # The type is everything up to the first space outside brackets
+    depth = 0
+    end = len(rest)
+    for i, char in enumerate(rest):
+        if char in "(<":
+            depth += 1
+        elif char in ")>":
+            depth -= 1
+        elif char.isspace() and depth == 0:
+            end = i
+            break
+
+    constraints = re.sub(r"\s+", " ", rest[end:].upper())
+    return Column(
+        name.strip("`"), rest[:end], nullable="NOT NULL" not in constraints.split(" AS ")[0]
+    )
+
+
+def _parse_table(match):
+    columns = [
+        _parse_column(element)
+        for element in _split_top_level(match.group("body"))
+        if not element.upper().startswith(_CONSTRAINT_PREFIXES)
+    ]
+
+    parent = on_delete = None
+    interleave = _INTERLEAVE_REGEX.search(match.group("rest"))
+    if interleave:
+        parent = interleave.group("parent")
+        on_delete = re.sub(r"\s+", "_", (interleave.group("on_delete") or "NO ACTION").upper())
+
+    return Table(
+        match.group("name"), columns, _key_columns(match.group("key")),
+        parent=parent, on_delete=on_delete
+    )
+
+
+def _parse_index(match):
+    rest = match.group("rest")
+    storing = _STORING_REGEX.search(rest)
+    interleave = _INDEX_INTERLEAVE_REGEX.search(rest)
+
+    return Index(
+        match.group("name"),
+        match.group("table"),
+        _key_columns(match.group("columns")),
+        unique=bool(match.group("unique")),
+        null_filtered=bool(match.group("null_filtered")),
+        storing=_key_columns(storing.group("columns")) if storing else [],
+        parent=interleave.group("parent") if interleave else None
+    )
+
+
+def _parse_statement(statement):
+    match = _CREATE_TABLE_REGEX.match(statement)
+    if match:
+        return _parse_table(match)
+
+    match = _CREATE_INDEX_REGEX.match(statement)
+    if match:
+        return _parse_index(match)
+
+    # Something we don't model (e.g. ALTER DATABASE or CREATE VIEW)
+    return None
+
+
+def _result_set(fields, rows):
+    # Builds an executeSql style response
+    return {
+        "metadata": {"rowType": {"fields": [
+            {"name": name, "type": {"code": code}} for name, code in fields
+        ]}},
+        "rows": rows
+    }
+
+
+def show_tables(schema):
+    return _result_set(
+        [("TABLE_NAME", "STRING"), ("PARENT_TABLE_NAME", "STRING"), ("ON_DELETE_ACTION", "STRING")],
+        [
+            [table.name, table.parent, table.on_delete]
+            for table in sorted(schema.tables.values(), key=lambda table: table.name)
+        ]
+    )
+
+
+def show_columns(schema, table_name):
+    table = schema.tables.get(table_name)
+    return _result_set(
+        [
+            ("COLUMN_NAME", "STRING"),
+            ("SPANNER_TYPE", "STRING"),
+            ("IS_NULLABLE", "STRING"),
+            ("ORDINAL_POSITION", "INT64"),
+        ],
+        [
+            # INT64 values are strings in the JSON API
+            [column.name, column.spanner_type, "YES" if column.nullable else "NO", str(i)]
+            for i, column in enumerate(table.columns if table else [], 1)
+        ]
+    )
+
+
+def show_index(schema, table_name, index_states=None):
+    """
+        index_states maps index names to their INDEX_STATE, which isn't in the
+        DDL (e.g. an index is WRITE_ONLY while it's being backfilled)
+    """
+    table = schema.tables.get(table_name)
+    index_states = index_states or {}
+
+    rows = []
+    if table:
+        rows.append([table.name, "PRIMARY_KEY", "PRIMARY_KEY", True, False, None])
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            rows.append([
+                table.name, index.name, "INDEX", index.unique, index.null_filtered,
+                index_states.get(index.name)
+            ])
+
+    return _result_set(
+        [
+            ("TABLE_NAME", "STRING"),
+            ("INDEX_NAME", "STRING"),
+            ("INDEX_TYPE", "STRING"),
+            ("IS_UNIQUE", "BOOL"),
+            ("IS_NULL_FILTERED", "BOOL"),
+            ("INDEX_STATE", "STRING"),
+        ],
+        rows
+    )
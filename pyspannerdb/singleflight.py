@@ -0,0 +1,95 @@
+"""
+    Request coalescing for reads. When lots of threads run the same read at the
+    same time (e.g. a stampede on a hot row after a cache miss) only the first
+    one is sent to Spanner, and the others wait for it and share its response.
+"""
+
+import sys
+import threading
+
+import six
+
+from .cache import _copy_response
+
+
+class _Flight(object):
+    def __init__(self):
+        self._event = threading.Event()
+        self._response = None
+        self._error = None
+
+        # Set if the request neither returned nor raised an Exception (e.g. the
+        # leader got a KeyboardInterrupt or GreenletExit)
+        self._interrupted = False
+
+    def result(self):
+        if self._error:
+            six.reraise(*self._error)
+        return _copy_response(self._response)
+
+
+class SingleFlight(object):
+    """
+        Runs at most one request per key at a time. Callers which ask for a key
+        that's already in flight wait for that request to finish and get a copy of
+        its response (or its error) rather than sending their own.
+
+        Nothing is kept once a request finishes, so unlike ResultCache a caller
+        never gets a response to a request that finished before it asked. It can
+        get one which was *sent* before it asked though, so a strong read may not
+        see a write committed while the shared request was in flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+        self.requests = 0
+        self.coalesced = 0
+
+    def run(self, key, func):
+        """
+            Returns a copy of func()'s response, calling func() only if
+            there isn't already a request in flight for `key`
+        """
+        with self._lock:
+            self.requests += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight._event.wait()
+            if flight._interrupted:
+                # Nothing to share, send it ourselves
+                return self.run(key, func)
+            return flight.result()
+
+        finished = False
+        try:
+            flight._response = func()
+            finished = True
+        except Exception:
+            flight._error = sys.exc_info()
+            finished = True
+        finally:
+            flight._interrupted = not finished
+
+            # Callers which arrive from now on send a new request
+            with self._lock:
+                del self._flights[key]
+            flight._event.set()
+
+        return flight.result()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+            }
@@ -0,0 +1,162 @@
+import threading
+
+from collections import OrderedDict, deque
+
+
+# Number of statement fingerprints StatementStatsTable keeps by default
+DEFAULT_MAX_STATEMENTS = 1000
+
+
+class RequestStats(object):
+    """
+        Byte counts for a single request to the Spanner API. "sent" and
+        "received" are what went over the wire (after compression), the
+        "uncompressed" variants are the size of the JSON bodies.
+    """
+    __slots__ = (
+        "url", "sent", "sent_uncompressed", "received", "received_uncompressed"
+    )
+
+    def __init__(self, url, sent, sent_uncompressed, received, received_uncompressed):
+        self.url = url
+        self.sent = sent
+        self.sent_uncompressed = sent_uncompressed
+        self.received = received
+        self.received_uncompressed = received_uncompressed
+
+    def __repr__(self):
+        return "<RequestStats {} sent={}/{} received={}/{}>".format(
+            self.url, self.sent, self.sent_uncompressed,
+            self.received, self.received_uncompressed
+        )
+
+
+class ConnectionStats(object):
+    """
+        Running totals of the traffic a Connection has generated. The last
+        `history_size` requests are kept individually in `recent_requests`.
+    """
+
+    def __init__(self, history_size=100):
+        self._lock = threading.Lock()
+        self.recent_requests = deque(maxlen=history_size)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.bytes_sent_uncompressed = 0
+            self.bytes_received = 0
+            self.bytes_received_uncompressed = 0
+            self.recent_requests.clear()
+
+    def record_request(self, request_stats):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += request_stats.sent
+            self.bytes_sent_uncompressed += request_stats.sent_uncompressed
+            self.bytes_received += request_stats.received
+            self.bytes_received_uncompressed += request_stats.received_uncompressed
+            self.recent_requests.append(request_stats)
+
+    def record_stream(self, received, received_uncompressed):
+        """
+            Adds the body of a streamed response, which is read (and so only
+            counted) after its request has been recorded
+        """
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_received_uncompressed += received_uncompressed
+
+    @property
+    def last_request(self):
+        return self.recent_requests[-1] if self.recent_requests else None
+
+
+class StatementStats(object):
+    """
+        Totals for every execution of statements with the same fingerprint
+        (see pyspannerdb.parser.fingerprint_sql). Latencies are in seconds.
+    """
+    __slots__ = ("fingerprint", "count", "total_latency", "max_latency", "rows", "bytes")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.count if self.count else 0.0
+
+    def _copy(self):
+        copy = StatementStats(self.fingerprint)
+        for name in self.__slots__:
+            setattr(copy, name, getattr(self, name))
+        return copy
+
+    def __repr__(self):
+        return "<StatementStats {} count={} total={:.3f}s max={:.3f}s rows={} bytes={}>".format(
+            self.fingerprint, self.count, self.total_latency, self.max_latency,
+            self.rows, self.bytes
+        )
+
+
+class StatementStatsTable(object):
+    """
+        StatementStats for each statement fingerprint a Connection has executed.
+        At most max_statements fingerprints are kept, when a new one comes along
+        the one which was executed least recently is dropped.
+    """
+
+    def __init__(self, max_statements=DEFAULT_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._statements = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._statements)
+
+    def record(self, fingerprint, latency, rows, bytes_transferred):
+        with self._lock:
+            stats = self._statements.pop(fingerprint, None)
+            if stats is None:
+                stats = StatementStats(fingerprint)
+                if len(self._statements) >= self.max_statements:
+                    self._statements.popitem(last=False)
+                    self.evictions += 1
+
+            # Most recently executed at the end
+            self._statements[fingerprint] = stats
+
+            stats.count += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.rows += rows
+            stats.bytes += bytes_transferred
+
+    def get(self, fingerprint):
+        with self._lock:
+            stats = self._statements.get(fingerprint)
+            return stats._copy() if stats else None
+
+    def top(self, count=10, key="total_latency"):
+        """
+            Returns (copies of) the `count` StatementStats with the highest
+            `key`, e.g. "total_latency", "max_latency", "count" or "bytes"
+        """
+        with self._lock:
+            statements = [stats._copy() for stats in self._statements.values()]
+
+        statements.sort(key=lambda stats: getattr(stats, key), reverse=True)
+        return statements[:count]
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.evictions = 0
@@ -0,0 +1,171 @@
+"""
+    Support for executeStreamingSql, which returns a result set as a JSON array of
+    PartialResultSet objects. We parse these one at a time as they come off the
+    socket so the full result set is never held in memory.
+"""
+
+import codecs
+import json
+
+import six
+
+from .codec import READ_CHUNK_SIZE, open_body_stream
+
+
+def _merge_chunked_values(first, second):
+    """
+        Values which are too big for a single PartialResultSet are split in
+        two, this joins the halves back together following the rules in the
+        PartialResultSet documentation.
+    """
+    if isinstance(first, six.string_types):
+        return first + second
+
+    # Lists (ARRAYs and STRUCTs)
+    if first and second and isinstance(first[-1], (list, ) + six.string_types) and \
+            type(first[-1]) == type(second[0]):
+        return first[:-1] + [_merge_chunked_values(first[-1], second[0])] + second[1:]
+
+    return first + second
+
+
+class _JSONArrayReader(object):
+    """
+        Incrementally yields the elements of a top-level JSON array read
+        from a file-like object.
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = u""
+        self._read_size = READ_CHUNK_SIZE
+        self._done = False
+
+        # The size of the (decompressed) JSON read so far
+        self.bytes_read = 0
+
+    def _fill(self):
+        chunk = self._file.read(self._read_size)
+        if not chunk:
+            self._done = True
+            return False
+
+        self.bytes_read += len(chunk)
+        if isinstance(chunk, six.binary_type):
+            # Incremental, so multi-byte characters split across reads work
+            chunk = self._text_decoder.decode(chunk)
+        self._buffer += chunk
+        return True
+
+    def _skip(self, characters):
+        while True:
+            stripped = self._buffer.lstrip()
+            if stripped and stripped[0] in characters:
+                stripped = stripped[1:]
+                self._buffer = stripped
+                continue
+
+            self._buffer = stripped
+            if stripped or not self._fill():
+                return
+
+    def __iter__(self):
+        while True:
+            self._skip("[,")
+            if not self._buffer or self._buffer[0] == "]":
+                return
+
+            try:
+                element, end = self._decoder.raw_decode(self._buffer)
+            except ValueError:
+                if self._done:
+                    raise
+                # Incomplete element, read more and try again with a bigger
+                # read so big elements don't get re-parsed too many times
+                self._fill()
+                self._read_size *= 2
+                continue
+
+            self._read_size = READ_CHUNK_SIZE
+            self._buffer = self._buffer[end:]
+            yield element
+
+
+class StreamingResultSet(object):
+    """
+        Wraps the response of an executeStreamingSql call. The first
+        PartialResultSet (which contains the metadata) is read straight away,
+        the rows are read lazily by iterating rows(). row_count is only set once
+        all the rows have been read, rows_read counts them as they go.
+    """
+
+    def __init__(self, response, on_close=None):
+        self._response = response
+        self._on_close = on_close
+        self._body = open_body_stream(response)
+        self._reader = _JSONArrayReader(self._body)
+        self._partial_result_sets = iter(self._reader)
+        self._first = next(self._partial_result_sets, {})
+        self.metadata = self._first.get("metadata", {})
+        self.stats = None
+        self.row_count = None
+        self.rows_read = 0
+
+    @property
+    def bytes_received(self):
+        # What's come over the wire so far
+        return self._body.wire_bytes
+
+    @property
+    def bytes_received_uncompressed(self):
+        return self._reader.bytes_read
+
+    def rows(self):
+        width = len(self.metadata.get("rowType", {}).get("fields", [])) or 1
+        pending = []
+        chunk = None
+
+        partial_result_set = self._first
+        self._first = None
+
+        try:
+            while partial_result_set is not None:
+                values = partial_result_set.get("values", [])
+                if chunk is not None and values:
+                    values[0] = _merge_chunked_values(chunk, values[0])
+                    chunk = None
+
+                if partial_result_set.get("chunkedValue") and values:
+                    chunk = values.pop()
+
+                if "stats" in partial_result_set:
+                    self.stats = partial_result_set["stats"]
+
+                pending.extend(values)
+
+                # Release the page before we start yielding its rows
+                partial_result_set = values = None
+
+                whole_rows = len(pending) - (len(pending) % width)
+                for i in range(0, whole_rows, width):
+                    self.rows_read += 1
+                    yield pending[i:i + width]
+                del pending[:whole_rows]
+
+                partial_result_set = next(self._partial_result_sets, None)
+
+            self.row_count = self.rows_read
+        finally:
+            self.close()
+
+    def close(self):
+        if self._response is not None:
+            close = getattr(self._response, "close", None)
+            if close:
+                close()
+            self._response = None
+
+            if self._on_close:
+                self._on_close()
@@ -40,6 +40,9 @@ def mock_response(target_url_or_endpoint, json_file, status_code=200):
 class TestCase(PyTestCase):
     def setUp(self):
         with mock_response(ENDPOINT_SESSION_CREATE, join(MOCK_RESPONSE_DIR, "create_session.json")):
-            self.connection = Connection("test", "test", "test", "test")
+            # No background session creation, tests count the requests we make
+            self.connection = Connection(
+                "test", "test", "test", "test", min_available_sessions=0
+            )
             self.connection.autocommit(True)
 
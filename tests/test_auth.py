@@ -0,0 +1,51 @@
+import sleuth
+import time
+
+from unittest import TestCase
+
+from pyspannerdb.auth import CredentialsProvider
+
+
+class TestCredentialsProvider(TestCase):
+    def test_token_is_cached(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return "token%s" % len(calls), time.time() + 3600
+
+        provider = CredentialsProvider(fetch)
+        self.assertEqual("token1", provider.get_token())
+        self.assertEqual("token1", provider.get_token())
+        self.assertEqual(1, len(calls))
+
+    def test_expired_token_is_refetched(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return "token%s" % len(calls), time.time() - 1
+
+        provider = CredentialsProvider(fetch)
+        self.assertEqual("token1", provider.get_token())
+        self.assertEqual("token2", provider.get_token())
+
+    def test_refresh(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return "token%s" % len(calls), time.time() + 3600
+
+        provider = CredentialsProvider(fetch)
+        provider.get_token()
+        self.assertTrue(provider.refresh())
+        self.assertEqual("token2", provider.get_token())
+
+    def test_lock_is_replaced_after_fork(self):
+        provider = CredentialsProvider(lambda: ("token", time.time() - 1))
+
+        # As if a thread in the parent was refreshing when it forked
+        provider._lock.acquire()
+        with sleuth.switch("os.getpid", lambda: -1):
+            self.assertEqual("token", provider.get_token())
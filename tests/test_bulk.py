@@ -0,0 +1,113 @@
+import json
+import sleuth
+import threading
+
+from .base import TestCase
+from pyspannerdb.errors import BulkImportError
+
+
+class FakeResponse(object):
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+class FakeSpanner(object):
+    def __init__(self, fail_on_batch=None):
+        self.lock = threading.Lock()
+        self.committed = []
+        self.fail_on_batch = fail_on_batch
+
+    def __call__(self, url, payload=None, **kwargs):
+        if url.endswith("/sessions"):
+            return FakeResponse('{"name": "sessions/extra"}')
+
+        if url.endswith("/ddl"):
+            return FakeResponse(json.dumps({"statements": [
+                "CREATE TABLE test (id INT64 NOT NULL, name STRING(MAX)) PRIMARY KEY (id)"
+            ]}))
+
+        data = json.loads(payload)
+
+        values = data["mutations"][0]["insertOrUpdate"]["values"]
+        if self.fail_on_batch is not None and values[0][0] == str(self.fail_on_batch * 10):
+            return FakeResponse('{"error": {}}', status_code=500)
+
+        with self.lock:
+            self.committed.extend(values)
+        return FakeResponse('{}')
+
+
+class TestBulkImport(TestCase):
+    def test_rows_are_committed_in_batches(self):
+        spanner = FakeSpanner()
+        progress = []
+
+        rows = ((i, "row%s" % i) for i in range(45))
+        with sleuth.switch("pyspannerdb.fetch.fetch", spanner):
+            result = self.connection.bulk_import(
+                "test", ["id", "name"], rows, batch_size=10, progress=progress.append
+            )
+
+        self.assertEqual(5, result.batches)
+        self.assertEqual(45, result.rows)
+        self.assertEqual(5, len(progress))
+        self.assertEqual(
+            sorted([[str(i), "row%s" % i] for i in range(45)]), sorted(spanner.committed)
+        )
+
+    def test_deadline_applies_to_commits(self):
+        spanner = FakeSpanner()
+
+        rows = ((i, "row%s" % i) for i in range(30))
+        with sleuth.switch("pyspannerdb.fetch.fetch", spanner) as fetch:
+            with self.connection.deadline(2):
+                self.connection.bulk_import("test", ["id", "name"], rows, batch_size=10)
+
+        timeouts = [
+            call.kwargs["deadline"] for call in fetch.calls if call.args[0].endswith(":commit")
+        ]
+        self.assertEqual(3, len(timeouts))
+        self.assertTrue(all(0 < timeout <= 2 for timeout in timeouts))
+
+    def test_batches_stay_under_the_commit_size_limit(self):
+        spanner = FakeSpanner()
+        rows = [(i, "row%s" % i) for i in range(45)]
+
+        # Room for a few rows per commit
+        with sleuth.switch("pyspannerdb.bulk.MAX_COMMIT_SIZE_BYTES", 64 * 1024 + 50):
+            with sleuth.switch("pyspannerdb.fetch.fetch", spanner):
+                result = self.connection.bulk_import(
+                    "test", ["id", "name"], rows, batch_size=10, max_workers=1
+                )
+
+        self.assertTrue(result.batches > 5)
+        self.assertEqual(45, result.rows)
+        self.assertEqual(
+            sorted([[str(i), "row%s" % i] for i in range(45)]), sorted(spanner.committed)
+        )
+
+    def test_resume_after_failure(self):
+        spanner = FakeSpanner(fail_on_batch=2)
+        rows = [(i, "row%s" % i) for i in range(45)]
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", spanner):
+            try:
+                self.connection.bulk_import(
+                    "test", ["id", "name"], rows, batch_size=10, max_workers=1
+                )
+                self.fail("Expected the import to fail")
+            except BulkImportError as e:
+                resume_from = e.resume_from
+
+            self.assertEqual(2, resume_from)
+
+            spanner.fail_on_batch = None
+            result = self.connection.bulk_import(
+                "test", ["id", "name"], rows, batch_size=10, resume_from=resume_from
+            )
+
+        self.assertEqual(3, result.batches)
+        self.assertEqual(
+            sorted([[str(i), "row%s" % i] for i in range(45)]), sorted(spanner.committed)
+        )
@@ -0,0 +1,75 @@
+import io
+import json
+
+from unittest import TestCase
+
+from pyspannerdb import codec
+from pyspannerdb.codec import CODECS, UJSONCodec, get_codec, gzip_compress, read_body
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, content):
+        super(FakeResponse, self).__init__(content)
+        self.headers = {"Content-Length": str(len(content))}
+
+
+class TestCodec(TestCase):
+    def test_stdlib_fallback(self):
+        self.assertEqual("json", get_codec("json").name)
+
+        if codec.orjson is None and codec.ujson is None:
+            self.assertEqual("json", get_codec().name)
+
+    def test_roundtrip(self):
+        c = get_codec()
+        data = {"rows": [["1", "a"], ["2", None]]}
+        self.assertEqual(data, c.loads(c.dumps(data)))
+
+    def test_non_ascii_roundtrip(self):
+        data = {"rows": [[u"caf\u00e9", u"\u6771\u4eac"]]}
+
+        for name in CODECS:
+            try:
+                c = get_codec(name)
+            except ImportError:
+                continue
+
+            content = c.dumps(data)
+            self.assertEqual(data, c.loads(content))
+            self.assertEqual(data, json.loads(content.decode("utf-8")))
+
+    def test_ujson_returning_bytes(self):
+        class FakeUJSON(object):
+            # ujson on Python 2 returns UTF-8 encoded bytes
+            @staticmethod
+            def dumps(data, ensure_ascii=True):
+                return json.dumps(data, ensure_ascii=ensure_ascii).encode("utf-8")
+
+        original = codec.ujson
+        codec.ujson = FakeUJSON
+        try:
+            content = UJSONCodec().dumps({"name": u"caf\u00e9"})
+        finally:
+            codec.ujson = original
+
+        self.assertEqual(u'{"name": "caf\u00e9"}', content.decode("utf-8"))
+
+    def test_read_body_from_file(self):
+        c = get_codec()
+        response = FakeResponse(b'{"id": "1234"}')
+        content, received = read_body(response, c)
+        self.assertEqual({"id": "1234"}, c.loads(content))
+        self.assertEqual(14, received)
+
+    def test_read_gzipped_body(self):
+        c = get_codec()
+        body = b'{"rows": [' + b",".join([b'["1"]'] * 1000) + b']}'
+        compressed = gzip_compress(body)
+
+        response = FakeResponse(compressed)
+        response.headers["Content-Encoding"] = "gzip"
+
+        content, received = read_body(response, c)
+        self.assertEqual(len(compressed), received)
+        self.assertEqual(len(body), len(content))
+        self.assertEqual(1000, len(c.loads(content)["rows"]))
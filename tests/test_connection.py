@@ -0,0 +1,1178 @@
+import io
+import json
+import sleuth
+import socket
+import threading
+import time
+
+from .base import TestCase
+from pyspannerdb import ConnectionFactory
+from pyspannerdb.auth import StaticCredentials
+from pyspannerdb.errors import (
+    DatabaseError,
+    OperationalError,
+    ProgrammingError,
+    SessionNotFoundError
+)
+from pyspannerdb.pool import SessionPool
+from pyspannerdb.singleflight import SingleFlight
+
+
+class TestThreadSafety(TestCase):
+    def test_transaction_state_is_per_thread(self):
+        self.connection.autocommit(False)
+        self.connection._pk_lookup["test"] = "id"
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [1, 2])
+
+        seen = []
+
+        def other_thread():
+            seen.append(list(self.connection._transaction_mutations))
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [3, 4])
+            seen.append(len(self.connection._transaction_mutations))
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+
+        self.assertEqual([[], 1], seen)
+        self.assertEqual(1, len(self.connection._transaction_mutations))
+
+    def test_cursors_created_before_a_fork_are_reset(self):
+        self.connection.autocommit(False)
+
+        with self.connection.cursor() as cursor:
+            # As if the process forked after the cursor was created
+            self.connection._pid = -1
+
+            # Buffered until commit, so this doesn't send a request
+            with sleuth.watch("pyspannerdb.connection.Connection._reset_after_fork") as reset:
+                cursor.execute("CREATE INDEX test_by_field ON test (field)")
+
+        self.assertTrue(reset.called)
+
+
+class FakeResponse(object):
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+def fake_select(url, payload=None, **kwargs):
+    if url.endswith("/sessions"):
+        return FakeResponse('{"name": "sessions/extra"}')
+
+    if url.endswith(":commit"):
+        return FakeResponse('{}')
+
+    sql = json.loads(payload)["sql"]
+    return FakeResponse(json.dumps({
+        "metadata": {"rowType": {"fields": [{"name": "sql", "type": {"code": "STRING"}}]}},
+        "rows": [[sql]]
+    }))
+
+
+class TestTransactions(TestCase):
+    def test_read_write_transaction_has_no_extra_rpcs(self):
+        self.connection.autocommit(False)
+        self.connection._pk_lookup["test"] = "id"
+
+        def begin_inline(url, payload=None, **kwargs):
+            response = fake_select(url, payload, **kwargs)
+            if url.endswith(":executeSql"):
+                content = json.loads(response.content)
+                content["metadata"]["transaction"] = {"id": "txn"}
+                response.content = json.dumps(content)
+            return response
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", begin_inline) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [1, 2])
+                cursor.execute("SELECT 2")
+            self.connection.commit()
+
+        urls = [call.args[0].rsplit(":", 1)[-1] for call in fetch.calls]
+        self.assertEqual(["executeSql", "executeSql", "commit"], urls)
+
+        payloads = [json.loads(call.kwargs["payload"]) for call in fetch.calls]
+        self.assertEqual({"begin": {"readWrite": {}}}, payloads[0]["transaction"])
+        self.assertEqual({"id": "txn"}, payloads[1]["transaction"])
+        self.assertEqual("txn", payloads[2]["transactionId"])
+
+    def test_writes_in_read_only_transactions_fail(self):
+        self.connection.autocommit(False)
+        self.connection._pk_lookup["test"] = "id"
+
+        def begin_inline(url, payload=None, **kwargs):
+            response = fake_select(url, payload, **kwargs)
+            if url.endswith(":executeSql"):
+                content = json.loads(response.content)
+                content["metadata"]["transaction"] = {"id": "txn"}
+                response.content = json.dumps(content)
+            return response
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", begin_inline) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("START TRANSACTION READONLY")
+                with self.assertRaises(ProgrammingError):
+                    cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [1, 2])
+            self.connection.commit()
+
+        urls = [call.args[0].rsplit(":", 1)[-1] for call in fetch.calls]
+        self.assertEqual(["executeSql"], urls)
+
+
+class TestKeyGeneration(TestCase):
+    def insert(self, table):
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO {} (field) VALUES (?)".format(table), [1])
+
+        return json.loads(fetch.calls[-1].kwargs["payload"])["mutations"][0]["insert"]
+
+    def test_per_table_generators(self):
+        self.connection.autocommit(True)
+        self.connection._pk_lookup["test"] = "id"
+
+        self.connection.set_sequence_generator(lambda: 5)
+        self.connection.set_sequence_generator(None, table="other")
+
+        self.assertEqual([["5", "1"]], self.insert("test")["values"])
+
+        # Generation is disabled, the mutation is sent as-is without
+        # looking up the table's primary key
+        with sleuth.watch("pyspannerdb.connection.Connection.refresh_pk_lookup") as refresh:
+            self.assertEqual(["field"], self.insert("other")["columns"])
+        self.assertFalse(refresh.called)
+
+
+    def test_tables_created_earlier_in_a_script(self):
+        self.connection.autocommit(True)
+        self.connection.set_sequence_generator(lambda: 5)
+        create = "CREATE TABLE seeded (id INT64 NOT NULL, name STRING(MAX)) PRIMARY KEY (id)"
+        applied = []
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/ddl"):
+                if kwargs["method"] == "GET":
+                    return FakeResponse(json.dumps({"statements": applied}))
+                applied.extend(json.loads(payload)["statements"])
+                return FakeResponse('{"name": "operations/1"}')
+            elif "operations/" in url:
+                return FakeResponse('{"done": true}')
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute(create + ";\nINSERT INTO seeded (name) VALUES (?)", [u"a"])
+
+        self.assertEqual([create], applied)
+        mutation = json.loads(fetch.calls[-1].kwargs["payload"])["mutations"][0]["insert"]
+        self.assertEqual(["id", "name"], mutation["columns"])
+        self.assertEqual([["5", "a"]], mutation["values"])
+
+    def test_missing_tables(self):
+        self.connection.autocommit(True)
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/ddl"):
+                return FakeResponse('{"statements": []}')
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            with self.connection.cursor() as cursor:
+                with self.assertRaises(ProgrammingError):
+                    cursor.execute("INSERT INTO missing (name) VALUES (?)", [u"a"])
+
+
+class TestMutationLimits(TestCase):
+    def setUp(self):
+        super(TestMutationLimits, self).setUp()
+        self.connection._pk_lookup["test"] = "id"
+        self.connection.max_commit_mutations = 4
+
+    def commits(self, fetch):
+        return [
+            json.loads(call.kwargs["payload"])["mutations"]
+            for call in fetch.calls if call.args[0].endswith(":commit")
+        ]
+
+    def test_transactions_fail_before_commit(self):
+        self.connection.autocommit(False)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [1, 1])
+                cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [2, 1])
+                with self.assertRaises(ProgrammingError):
+                    cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [3, 1])
+
+            self.assertEqual([], self.commits(fetch))
+
+            # The transaction can still be committed
+            self.connection.commit()
+            self.assertEqual(2, len(self.commits(fetch)[0]))
+
+    def test_executemany_splits_commits(self):
+        self.connection.autocommit(True)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.executemany(
+                    "INSERT INTO test (id, field) VALUES (?, ?)",
+                    [[i, 1] for i in range(5)]
+                )
+
+        self.assertEqual([2, 2, 1], [len(mutations) for mutations in self.commits(fetch)])
+
+    def test_script_ddl_is_applied_before_splitting(self):
+        self.connection.autocommit(True)
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/ddl"):
+                return FakeResponse('{"name": "operations/1"}')
+            elif "operations/" in url:
+                return FakeResponse('{"done": true}')
+            return fake_select(url, payload=payload, **kwargs)
+
+        script = "CREATE TABLE test (id INT64, field INT64) PRIMARY KEY (id);\n" + "\n".join(
+            "INSERT INTO test (id, field) VALUES (?, ?);" for i in range(3)
+        )
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute(script, [0, 1, 1, 1, 2, 1])
+
+        # The table is created before the first of the writes is committed
+        requests = [
+            "ddl" if call.args[0].endswith("/ddl") else "commit"
+            for call in fetch.calls if call.args[0].endswith((":commit", "/ddl"))
+        ]
+        self.assertEqual(["ddl", "commit", "commit"], requests)
+        self.assertEqual([2, 1], [len(mutations) for mutations in self.commits(fetch)])
+
+    def test_statements_which_can_never_fit(self):
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select):
+            with self.connection.cursor() as cursor:
+                with self.assertRaises(ProgrammingError):
+                    cursor.execute(
+                        "INSERT INTO test (id, a, b, c, d) VALUES (?, ?, ?, ?, ?)", [1, 2, 3, 4, 5]
+                    )
+
+
+class TestSchemaIntrospection(TestCase):
+    def test_schema_is_fetched_once(self):
+        ddl = json.dumps({"statements": [
+            "CREATE TABLE test (id INT64 NOT NULL, field STRING(MAX)) PRIMARY KEY (id)",
+            "CREATE INDEX test_by_field ON test (field)",
+        ]})
+
+        with sleuth.fake("pyspannerdb.fetch.fetch", return_value=FakeResponse(ddl)) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SHOW TABLES")
+                self.assertEqual([["test", None, None]], list(cursor.fetchall()))
+
+                cursor.execute("SHOW COLUMNS FROM test")
+                self.assertEqual(["id", "field"], [row[0] for row in cursor.fetchall()])
+
+                cursor.execute("SHOW DDL test_by_field")
+                self.assertEqual(
+                    ["CREATE INDEX test_by_field ON test (field)"], list(cursor.fetchall())
+                )
+
+            self.assertEqual({"id": "INT64", "field": "STRING(MAX)"},
+                self.connection._query_column_types("test"))
+
+        self.assertEqual(1, fetch.call_count)
+        self.assertEqual("GET", fetch.calls[0].kwargs["method"])
+
+    def test_show_index_reads_index_states(self):
+        ddl = json.dumps({"statements": [
+            "CREATE TABLE test (id INT64 NOT NULL, field STRING(MAX)) PRIMARY KEY (id)",
+            "CREATE INDEX test_by_field ON test (field)",
+        ]})
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/ddl"):
+                return FakeResponse(ddl)
+            elif url.endswith(":executeSql"):
+                return FakeResponse(json.dumps({"rows": [["test_by_field", "WRITE_ONLY"]]}))
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            with self.connection.cursor() as cursor:
+                cursor.execute("SHOW INDEX FROM test")
+                self.assertEqual([
+                    ["test", "PRIMARY_KEY", "PRIMARY_KEY", True, False, None],
+                    ["test", "test_by_field", "INDEX", False, False, "WRITE_ONLY"],
+                ], list(cursor.fetchall()))
+
+
+class TestDDLBatching(TestCase):
+    def test_batch_is_one_operation(self):
+        self.connection.autocommit(True)
+        polls = []
+
+        def fake_ddl(url, payload=None, **kwargs):
+            if url.endswith("/ddl"):
+                return FakeResponse('{}')
+
+            # The operation is still running the first time it's polled
+            polls.append(url)
+            return FakeResponse(json.dumps({"done": len(polls) > 1}))
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_ddl) as fetch:
+            with self.connection.batch_ddl():
+                with self.connection.cursor() as cursor:
+                    cursor.execute("CREATE INDEX a_by_name ON a (name)")
+                    cursor.execute("CREATE INDEX b_by_name ON b (name)")
+                    cursor.execute("CREATE INDEX a_by_age ON a (age)")
+
+                # Nothing is sent until the block exits
+                self.assertFalse(fetch.called)
+
+        updates = [
+            json.loads(call.kwargs["payload"])["statements"]
+            for call in fetch.calls if call.args[0].endswith("/ddl")
+        ]
+
+        self.assertEqual([[
+            "CREATE INDEX a_by_name ON a (name)",
+            "CREATE INDEX b_by_name ON b (name)",
+            "CREATE INDEX a_by_age ON a (age)",
+        ]], updates)
+        self.assertEqual(2, len(polls))
+
+    def test_failed_operations_raise(self):
+        def fake_ddl(url, payload=None, **kwargs):
+            if url.endswith("/ddl"):
+                return FakeResponse('{}')
+            return FakeResponse('{"done": true, "error": {"code": 3, "message": "Bad DDL"}}')
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_ddl):
+            with self.assertRaises(DatabaseError):
+                with self.connection.batch_ddl():
+                    self.connection.cursor().execute("CREATE INDEX a_by_name ON a (name)")
+
+
+class TestScripts(TestCase):
+    def test_script_writes_are_one_commit(self):
+        self.connection.autocommit(True)
+        self.connection.compression_threshold = None
+        self.connection._pk_lookup["test"] = "id"
+
+        script = "SELECT 1;\n" + "\n".join(
+            "INSERT INTO test (id, field) VALUES (?, ?);" for i in range(500)
+        ) + "\nSELECT 2"
+        params = []
+        for i in range(500):
+            params.extend([i, u"value"])
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute(script, params)
+                self.assertEqual([["SELECT 1"]], list(cursor.fetchall()))
+
+                for i in range(500):
+                    self.assertTrue(cursor.nextset())
+
+                self.assertTrue(cursor.nextset())
+                self.assertEqual([["SELECT 2"]], list(cursor.fetchall()))
+                self.assertIsNone(cursor.nextset())
+
+        urls = [call.args[0].rsplit(":", 1)[-1] for call in fetch.calls]
+        self.assertEqual(["executeSql", "executeSql", "commit"], urls)
+
+        mutations = json.loads(fetch.calls[-1].kwargs["payload"])["mutations"]
+        self.assertEqual(500, len(mutations))
+        self.assertEqual([["499", "value"]], mutations[-1]["insert"]["values"])
+
+    def test_many_parameters(self):
+        self.connection.autocommit(True)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            self.connection.cursor().execute(
+                "SELECT * FROM test WHERE id IN ({})".format(", ".join(["?"] * 60)), list(range(60))
+            )
+
+        data = json.loads(fetch.calls[-1].kwargs["payload"])
+        self.assertEqual(60, len(data["params"]))
+        self.assertEqual("59", data["params"]["p59"])
+
+
+class TestExecuteBatch(TestCase):
+    def test_results_are_in_input_order(self):
+        statements = [("SELECT %s" % i, None) for i in range(10)]
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            cursors = self.connection.execute_batch(statements, max_concurrency=4)
+
+        self.assertEqual(
+            [[["SELECT %s" % i]] for i in range(10)],
+            [list(cursor.fetchall()) for cursor in cursors]
+        )
+
+    def test_statements_share_a_snapshot(self):
+        def fake_read(url, payload=None, **kwargs):
+            response = fake_select(url, payload, **kwargs)
+            if url.endswith(":executeSql"):
+                content = json.loads(response.content)
+                content["metadata"]["transaction"] = {"readTimestamp": "2017-06-01T11:00:00Z"}
+                response.content = json.dumps(content)
+            return response
+
+        statements = [("SELECT %s" % i, None) for i in range(3)]
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_read) as fetch:
+            cursors = self.connection.execute_batch(statements)
+
+        self.assertEqual(
+            [[["SELECT %s" % i]] for i in range(3)],
+            [list(cursor.fetchall()) for cursor in cursors]
+        )
+
+        selectors = [
+            json.loads(call.kwargs["payload"])["transaction"]["singleUse"]
+            for call in fetch.calls if call.args[0].endswith(":executeSql")
+        ]
+
+        # The first statement picks the timestamp, the rest read at it
+        self.assertEqual(
+            {"readOnly": {"strong": True, "returnReadTimestamp": True}}, selectors[0]
+        )
+        self.assertEqual(
+            [{"readOnly": {"readTimestamp": "2017-06-01T11:00:00Z"}}] * 2, selectors[1:]
+        )
+
+    def test_common_staleness(self):
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            self.connection.execute_batch(
+                [("SELECT 1", None), ("SELECT 2", None)], exact_staleness=10
+            )
+
+        selectors = [
+            json.loads(call.kwargs["payload"])["transaction"]
+            for call in fetch.calls if call.args[0].endswith(":executeSql")
+        ]
+        self.assertEqual(
+            [{"singleUse": {"readOnly": {"exactStaleness": "10s"}}}] * 2, selectors
+        )
+
+
+class TestDeadlines(TestCase):
+    def test_timed_out_reads_are_retried(self):
+        self.connection.autocommit(True)
+        attempts = []
+
+        def flaky_select(url, payload=None, **kwargs):
+            if url.endswith(":executeSql"):
+                attempts.append(kwargs["deadline"])
+                if len(attempts) == 1:
+                    raise socket.timeout("timed out")
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", flaky_select):
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                self.assertEqual([["SELECT 1"]], list(cursor.fetchall()))
+
+        self.assertEqual(2, len(attempts))
+
+    def test_commits_are_not_retried(self):
+        self.connection._pk_lookup["test"] = "id"
+
+        def slow_commit(url, payload=None, **kwargs):
+            if url.endswith(":commit"):
+                raise socket.timeout("timed out")
+            return fake_select(url, payload, **kwargs)
+
+        self.connection.autocommit(True)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", slow_commit) as fetch:
+            with self.assertRaises(OperationalError) as context:
+                self.connection.cursor().execute(
+                    "INSERT INTO test (id, field) VALUES (?, ?)", [1, 2]
+                )
+
+        self.assertTrue(context.exception.retryable)
+        self.assertEqual(1, len([c for c in fetch.calls if c.args[0].endswith(":commit")]))
+
+    def test_aborted_single_use_commits_are_retried(self):
+        self.connection._pk_lookup["test"] = "id"
+        self.connection.autocommit(True)
+        commits = []
+
+        def aborting_commit(url, payload=None, **kwargs):
+            if url.endswith(":commit"):
+                commits.append(url)
+                if len(commits) == 1:
+                    return FakeResponse(json.dumps({"error": {
+                        "code": 409, "status": "ABORTED", "message": "Transaction aborted",
+                        "details": [{
+                            "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                            "retryDelay": "0.01s"
+                        }]
+                    }}), status_code=409)
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", aborting_commit):
+            self.connection.cursor().execute(
+                "INSERT INTO test (id, field) VALUES (?, ?)", [1, 2]
+            )
+
+        self.assertEqual(2, len(commits))
+
+    def test_deadline_limits_request_timeout(self):
+        self.connection.autocommit(True)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.deadline(2):
+                self.connection.cursor().execute("SELECT 1")
+
+        self.assertTrue(0 < fetch.calls[-1].kwargs["deadline"] <= 2)
+
+    def test_deadline_applies_to_batched_reads(self):
+        statements = [("SELECT %s" % i, None) for i in range(4)]
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.deadline(2):
+                self.connection.execute_batch(statements, max_concurrency=4)
+
+        timeouts = [
+            call.kwargs["deadline"] for call in fetch.calls if call.args[0].endswith(":executeSql")
+        ]
+        self.assertEqual(4, len(timeouts))
+        self.assertTrue(all(0 < timeout <= 2 for timeout in timeouts))
+
+    def test_hedged_reads_use_fastest_response(self):
+        self.connection.autocommit(True)
+        self.connection.enable_hedged_reads(min_delay=0.01)
+        self.connection._read_latencies.record(0.01)
+        calls = []
+
+        def slow_first_select(url, payload=None, **kwargs):
+            if url.endswith(":executeSql"):
+                calls.append(url)
+                if len(calls) == 1:
+                    time.sleep(0.5)
+            return fake_select(url, payload, **kwargs)
+
+        start = time.time()
+        with sleuth.switch("pyspannerdb.fetch.fetch", slow_first_select):
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                self.assertEqual([["SELECT 1"]], list(cursor.fetchall()))
+
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(2, len(calls))
+
+
+class TestResultCache(TestCase):
+    def test_cached_reads_skip_rpc(self):
+        self.connection.enable_result_cache(["config"])
+        self.connection._pk_lookup["config"] = "id"
+
+        def executions(fetch):
+            return len([x for x in fetch.calls if x.args[0].endswith(":executeSql")])
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM config")
+                cursor.execute("SELECT  *  FROM config")
+                self.assertEqual([["SELECT * FROM config"]], list(cursor.fetchall()))
+                self.assertEqual(1, executions(fetch))
+
+                # Tables which aren't opted in are never cached
+                cursor.execute("SELECT * FROM other")
+                cursor.execute("SELECT * FROM other")
+                self.assertEqual(3, executions(fetch))
+
+                # Committing a write to the table invalidates the cache
+                cursor.execute("INSERT INTO config (id, value) VALUES (?, ?)", [1, 2])
+                cursor.execute("SELECT * FROM config")
+                self.assertEqual(4, executions(fetch))
+
+        metrics = self.connection.result_cache.metrics()
+        self.assertEqual(1, metrics["hits"])
+        self.assertEqual(1, metrics["invalidations"])
+
+    def test_transactional_reads_are_not_cached(self):
+        self.connection.enable_result_cache(["config", "other"])
+        self.connection.autocommit(False)
+
+        def executions(fetch):
+            return len([x for x in fetch.calls if x.args[0].endswith(":executeSql")])
+
+        def begin_transaction(url, payload=None, **kwargs):
+            if url.endswith(":rollback"):
+                return FakeResponse('{}')
+
+            response = fake_select(url, payload, **kwargs)
+            if url.endswith(":executeSql"):
+                data = json.loads(response.content)
+                data["metadata"]["transaction"] = {"id": "t1"}
+                response.content = json.dumps(data)
+            return response
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", begin_transaction) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM config")
+                self.assertEqual("t1", self.connection._transaction_id)
+                cursor.execute("SELECT * FROM config")
+                self.assertEqual(2, executions(fetch))
+                self.connection.rollback()
+
+        self.assertEqual(0, self.connection.result_cache.metrics()["entries"])
+
+    def test_comma_joins_are_not_cached(self):
+        self.connection.enable_result_cache(["config"])
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM config, secrets")
+                cursor.execute("SELECT * FROM config, secrets")
+
+        self.assertEqual(0, self.connection.result_cache.metrics()["entries"])
+
+
+class TestReadYourWrites(TestCase):
+    def test_reads_are_bounded_by_the_last_commit(self):
+        self.connection._pk_lookup["test"] = "id"
+        self.connection.read_your_writes(True)
+
+        def spanner(url, payload=None, **kwargs):
+            if url.endswith(":commit"):
+                return FakeResponse('{"commitTimestamp": "2017-06-01T11:00:00.5Z"}')
+            return fake_select(url, payload, **kwargs)
+
+        def selector(call):
+            return json.loads(call.kwargs["payload"])["transaction"]
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", spanner) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                self.assertEqual(
+                    {"singleUse": {"readOnly": {"strong": True}}}, selector(fetch.calls[-1])
+                )
+
+                cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [1, 1])
+                self.assertEqual("2017-06-01T11:00:00.5Z", self.connection.commit_timestamp)
+                self.assertEqual("2017-06-01T11:00:00.5Z", self.connection.last_commit_timestamp)
+
+                cursor.execute("SELECT 1")
+                self.assertEqual(
+                    {"singleUse": {"readOnly": {"minReadTimestamp": "2017-06-01T11:00:00.5Z"}}},
+                    selector(fetch.calls[-1])
+                )
+
+                # Transactions stay strong, however old the last commit is
+                cursor.execute("START TRANSACTION READONLY")
+                self.assertEqual(
+                    {"begin": {"readOnly": {}}},
+                    selector(fetch.calls[-1])
+                )
+
+        # Other threads haven't committed anything
+        timestamps = []
+
+        def read_timestamp():
+            timestamps.append(self.connection.commit_timestamp)
+
+        thread = threading.Thread(target=read_timestamp)
+        thread.start()
+        thread.join()
+        self.assertEqual([None], timestamps)
+
+    def test_timestamps_are_compared_as_times(self):
+        self.connection._record_commit_timestamp({"commitTimestamp": "2017-06-01T11:00:00.5Z"})
+        self.connection._record_commit_timestamp({"commitTimestamp": "2017-06-01T11:00:00Z"})
+        self.assertEqual("2017-06-01T11:00:00.5Z", self.connection.last_commit_timestamp)
+
+
+class TestStatementStats(TestCase):
+    def test_stats_are_kept_per_fingerprint(self):
+        self.connection.enable_statement_stats(max_statements=2)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select):
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM t WHERE id = 1")
+                cursor.execute("SELECT * FROM t WHERE id = ?", [2])
+                cursor.execute("SELECT * FROM other")
+
+        stats = self.connection.statement_stats.get("SELECT * FROM t WHERE id = ?")
+        self.assertEqual(2, stats.count)
+        self.assertEqual(2, stats.rows)
+        self.assertTrue(stats.bytes > 0)
+        self.assertTrue(stats.max_latency <= stats.total_latency)
+
+        self.assertEqual(
+            ["SELECT * FROM t WHERE id = ?", "SELECT * FROM other"],
+            [stats.fingerprint for stats in self.connection.statement_stats.top(key="count")]
+        )
+
+        # A new fingerprint pushes out the least recently executed
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select):
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+        self.assertIsNone(self.connection.statement_stats.get("SELECT * FROM t WHERE id = ?"))
+        self.assertEqual(1, self.connection.statement_stats.evictions)
+
+    def test_slow_queries_are_logged(self):
+        self.connection.slow_query_threshold = 0
+
+        logger = "pyspannerdb.connection.slow_query_logger.warning"
+        with sleuth.switch(logger, lambda *args: None) as warning:
+            with sleuth.switch("pyspannerdb.fetch.fetch", fake_select):
+                with self.connection.cursor() as cursor:
+                    cursor.execute("SELECT * FROM t WHERE name = 'secret'")
+
+        self.assertTrue(warning.called)
+        self.assertEqual("SELECT * FROM t WHERE name = ?", warning.calls[0].args[-1])
+
+    def test_failed_statements_are_recorded(self):
+        self.connection.enable_statement_stats()
+
+        def fake_error(url, payload=None, **kwargs):
+            if url.endswith("/sessions"):
+                return fake_select(url, payload=payload, **kwargs)
+            return FakeResponse('{"error": {"code": 3, "message": "Bad query"}}', status_code=400)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_error):
+            with self.connection.cursor() as cursor:
+                with self.assertRaises(DatabaseError):
+                    cursor.execute("SELECT * FROM missing")
+
+        stats = self.connection.statement_stats.get("SELECT * FROM missing")
+        self.assertEqual(1, stats.count)
+        self.assertEqual(0, stats.rows)
+
+    def test_streamed_statements_are_recorded_when_read(self):
+        self.connection.enable_statement_stats()
+        body = json.dumps([
+            {"metadata": {"rowType": {"fields": [{"name": "id", "type": {"code": "STRING"}}]}}},
+            {"values": ["1", "2", "3"]},
+        ]).encode("utf-8")
+
+        def fake_stream(url, payload=None, **kwargs):
+            if url.endswith(":executeStreamingSql"):
+                response = io.BytesIO(body)
+                response.status_code = 200
+                response.headers = {}
+                return response
+            return fake_select(url, payload=payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_stream):
+            with self.connection.cursor(stream_results=True) as cursor:
+                cursor.execute("SELECT id FROM t")
+                self.assertIsNone(self.connection.statement_stats.get("SELECT id FROM t"))
+                self.assertEqual([["1"], ["2"], ["3"]], list(cursor.fetchall()))
+
+                stats = self.connection.statement_stats.get("SELECT id FROM t")
+                self.assertEqual(3, stats.rows)
+                self.assertTrue(stats.bytes > len(body))
+
+                # Closing a stream early records what was read
+                cursor.execute("SELECT id FROM t")
+                cursor.fetchone()
+
+        stats = self.connection.statement_stats.get("SELECT id FROM t")
+        self.assertEqual(2, stats.count)
+        self.assertEqual(4, stats.rows)
+        self.assertTrue(self.connection.stats.bytes_received >= 2 * len(body))
+
+
+class TestSingleFlight(TestCase):
+    def test_identical_concurrent_reads_share_a_request(self):
+        self.connection.enable_single_flight()
+        release = threading.Event()
+
+        def slow_select(url, payload=None, **kwargs):
+            if url.endswith(":executeSql"):
+                release.wait()
+            return fake_select(url, payload, **kwargs)
+
+        results = []
+
+        def read():
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM config WHERE id = ?", [1])
+                results.append(list(cursor.fetchall()))
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", slow_select) as fetch:
+            threads = [threading.Thread(target=read) for i in range(5)]
+            for thread in threads:
+                thread.start()
+
+            while self.connection.single_flight.metrics()["coalesced"] < 4:
+                time.sleep(0.01)
+
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        executions = [x for x in fetch.calls if x.args[0].endswith(":executeSql")]
+        self.assertEqual(1, len(executions))
+        self.assertEqual(5, len(results))
+        self.assertEqual(
+            {"in_flight": 0, "requests": 5, "coalesced": 4},
+            self.connection.single_flight.metrics()
+        )
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            release.wait()
+            raise OperationalError("Unavailable")
+
+        def run():
+            try:
+                flight.run("key", fail)
+            except OperationalError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        started.wait()
+
+        follower = threading.Thread(target=run)
+        follower.start()
+        while flight.metrics()["coalesced"] < 1:
+            time.sleep(0.01)
+
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(2, len(errors))
+        self.assertEqual(0, flight.metrics()["in_flight"])
+
+
+    def test_string_literals_are_part_of_the_key(self):
+        self.connection.enable_single_flight()
+
+        with sleuth.watch("pyspannerdb.singleflight.SingleFlight.run") as run:
+            with sleuth.switch("pyspannerdb.fetch.fetch", fake_select):
+                with self.connection.cursor() as cursor:
+                    cursor.execute("SELECT * FROM t WHERE n = 'a  b'")
+                    cursor.execute("SELECT * FROM t WHERE n = 'a b'")
+
+        first, second = [call.args[-2] for call in run.calls]
+        self.assertNotEqual(first, second)
+
+    def test_interrupted_requests_release_followers(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def interrupted():
+            started.set()
+            release.wait()
+            raise KeyboardInterrupt()
+
+        def leader():
+            try:
+                flight.run("key", interrupted)
+            except KeyboardInterrupt:
+                pass
+
+        leader_thread = threading.Thread(target=leader)
+        leader_thread.start()
+        started.wait()
+
+        follower = threading.Thread(
+            target=lambda: results.append(flight.run("key", lambda: {"rows": []}))
+        )
+        follower.start()
+        while flight.metrics()["coalesced"] < 1:
+            time.sleep(0.01)
+
+        release.set()
+        leader_thread.join()
+        follower.join(5)
+
+        # The follower sent its own request rather than waiting forever
+        self.assertEqual([{"rows": []}], results)
+        self.assertEqual(0, flight.metrics()["in_flight"])
+
+
+class TestPipelinedCommits(TestCase):
+    def setUp(self):
+        super(TestPipelinedCommits, self).setUp()
+        self.connection.autocommit(False)
+        self.connection.pipeline_commits(True)
+        self.connection._pk_lookup["test"] = "id"
+
+    def test_commit_does_not_block(self):
+        release = threading.Event()
+        committed = []
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/sessions"):
+                return FakeResponse('{"name": "sessions/extra"}')
+
+            release.wait()
+            committed.append(json.loads(payload)["mutations"][0]["insert"]["values"])
+            return FakeResponse('{}')
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [1])
+                first = self.connection.commit()
+
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [2])
+                second = self.connection.commit()
+
+                self.assertFalse(first.done())
+                release.set()
+
+                second.result()
+                self.assertTrue(first.done())
+
+        # Commits happen in order
+        self.assertEqual([[["1"]], [["2"]]], committed)
+
+    def test_failures_are_reported(self):
+        release = threading.Event()
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/sessions"):
+                return FakeResponse('{"name": "sessions/extra"}')
+
+            release.wait()
+            return FakeResponse('{"error": {}}', status_code=500)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [1])
+                first = self.connection.commit()
+
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [2])
+                second = self.connection.commit()
+                release.set()
+
+                self.assertRaises(DatabaseError, second.result)
+                self.assertIsNotNone(first.exception())
+
+                # The next commit reports the error
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [3])
+                self.assertRaises(DatabaseError, self.connection.commit)
+
+    def test_reads_wait_after_an_empty_commit(self):
+        requests = []
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith(":commit"):
+                time.sleep(0.1)
+            requests.append(url.rsplit(":", 1)[-1])
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [1])
+                self.connection.commit()
+
+                # Nothing to commit, but the read must still see the insert
+                self.connection.commit()
+                cursor.execute("SELECT 1")
+
+        self.assertEqual(["commit", "executeSql"], [
+            request for request in requests if request in ("commit", "executeSql")
+        ])
+
+    def test_threads_commit_concurrently(self):
+        arrived = threading.Semaphore(0)
+        both_arrived = threading.Event()
+
+        def fake_fetch(url, payload=None, **kwargs):
+            if url.endswith("/sessions"):
+                return FakeResponse('{"name": "sessions/extra"}')
+
+            arrived.release()
+            if not both_arrived.wait(5):
+                return FakeResponse('{"error": {"message": "Commits were serialised"}}', 500)
+
+            values = json.loads(payload)["mutations"][0]["insert"]["values"]
+            if values == [["1"]]:
+                return FakeResponse('{"error": {}}', status_code=500)
+            return FakeResponse('{}')
+
+        futures = {}
+        errors = {}
+
+        def run(key):
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id) VALUES (?)", [key])
+                futures[key] = self.connection.commit()
+                futures[key].wait()
+                try:
+                    self.connection.flush_commits()
+                except DatabaseError as e:
+                    errors[key] = e
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            threads = [threading.Thread(target=run, args=(key,)) for key in (1, 2)]
+            for thread in threads:
+                thread.start()
+
+            arrived.acquire()
+            arrived.acquire()
+            both_arrived.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertIsNotNone(futures[1].exception())
+        self.assertIsNone(futures[2].exception())
+
+        # The failure is only reported to the thread which made the commit
+        self.assertEqual([1], list(errors))
+
+
+class TestSessionPool(TestCase):
+    def test_sessions_are_reused(self):
+        created = []
+
+        def create():
+            created.append(1)
+            return "session%s" % len(created)
+
+        pool = SessionPool(create, lambda session: None)
+        pool.warm(2)
+        self.assertEqual(2, len(created))
+
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertNotEqual(first, second)
+
+        pool.release(first)
+        self.assertEqual(first, pool.acquire())
+        self.assertEqual(2, len(created))
+
+    def test_pool_grows_on_demand(self):
+        created = []
+
+        def create():
+            created.append(1)
+            return "session%s" % len(created)
+
+        pool = SessionPool(create, lambda session: None)
+        pool.acquire()
+        pool.acquire()
+        self.assertEqual(2, pool.size)
+
+    def test_warming_uses_batch_create(self):
+        batches = []
+
+        def batch_create(count):
+            batches.append(count)
+            return ["session%s" % i for i in range(count)]
+
+        pool = SessionPool(None, lambda session: None, batch_create_sessions=batch_create)
+        pool.warm(5)
+        self.assertEqual([5], batches)
+        self.assertEqual(5, pool.size)
+
+    def test_pool_replenishes_in_background(self):
+        created = threading.Semaphore(0)
+
+        def create():
+            created.release()
+            return "session%s" % time.time()
+
+        pool = SessionPool(create, lambda session: None, min_available=1)
+        pool.warm(1)
+        created.acquire()
+
+        pool.acquire()
+        created.acquire()  # Blocks until the background thread creates a session
+        self.assertEqual(2, pool.size)
+
+    def test_keep_alive_pings_idle_sessions(self):
+        sessions = iter(["alive", "deleted"])
+        pool = SessionPool(lambda: next(sessions), lambda session: None)
+        pool.warm(2)
+
+        pinged = []
+
+        def ping(session):
+            pinged.append(session)
+            if session == "deleted":
+                raise SessionNotFoundError()
+
+        pool.keep_alive(ping, idle_time=60)
+        self.assertEqual([], pinged)
+
+        pool.keep_alive(ping, idle_time=0)
+        self.assertEqual(["alive", "deleted"], sorted(pinged))
+        self.assertEqual(1, pool.size)
+        self.assertEqual("alive", pool.acquire())
+
+    def test_deleted_sessions_are_replaced(self):
+        self.connection.autocommit(True)
+        session_not_found = json.dumps({"error": {
+            "code": 404, "status": "NOT_FOUND", "message": "Session not found: sessions/test"
+        }})
+
+        def expired_session(url, payload=None, **kwargs):
+            if url.endswith("/sessions/test:executeSql"):
+                return FakeResponse(session_not_found, status_code=404)
+            return fake_select(url, payload, **kwargs)
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", expired_session) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                self.assertEqual([["SELECT 1"]], list(cursor.fetchall()))
+
+        self.assertTrue(fetch.calls[-1].args[0].endswith("/sessions/extra:executeSql"))
+        self.assertEqual("extra", self.connection._pool.acquire())
+
+
+class TestForking(TestCase):
+    def test_child_starts_with_new_sessions(self):
+        parent_pool = self.connection._pool
+        self.connection._session = "test"  # In the middle of a transaction
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_select) as fetch:
+            with sleuth.switch("os.getpid", lambda: -1):
+                with self.connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    self.assertEqual([["SELECT 1"]], list(cursor.fetchall()))
+
+                # Wait for the background session creation
+                while self.connection._pool._pending:
+                    time.sleep(0.01)
+
+        self.assertIsNot(parent_pool, self.connection._pool)
+        self.assertIsNone(self.connection._session)
+
+        urls = [call.args[0] for call in fetch.calls]
+        self.assertFalse([url for url in urls if "/sessions/test" in url])
+
+    def test_factory_creates_a_connection_per_process(self):
+        warmed = []
+
+        def warm_sessions(connection, count, wait=True):
+            warmed.append((count, wait))
+
+        factory = ConnectionFactory("test", "test", "test", min_available_sessions=0)
+        with sleuth.switch(
+            "pyspannerdb.get_credentials_provider", lambda *args, **kwargs: StaticCredentials("test")
+        ):
+            with sleuth.switch("pyspannerdb.connection.Connection.warm_sessions", warm_sessions):
+                connection = factory()
+                self.assertIs(connection, factory())
+
+                with sleuth.switch("os.getpid", lambda: -1):
+                    child_connection = factory()
+
+        self.assertIsNot(connection, child_connection)
+        self.assertEqual([(4, False), (4, False)], warmed)
@@ -98,7 +98,7 @@ class TestUpdateOperations(TestCase):
 
                 self.assertTrue(fetch.called)
 
-                data = json.loads(fetch.calls[1].kwargs["payload"])
+                data = json.loads(fetch.calls[0].kwargs["payload"])
                 self.assertEqual(1, len(data["mutations"]))
                 m0 = data["mutations"][0]
 
@@ -121,7 +121,7 @@ class TestDeleteOperations(TestCase):
 
                 self.assertTrue(fetch.called)
 
-                data = json.loads(fetch.calls[1].kwargs["payload"])
+                data = json.loads(fetch.calls[0].kwargs["payload"])
                 self.assertEqual(1, len(data["mutations"]))
                 m0 = data["mutations"][0]
 
@@ -140,7 +140,7 @@ class TestDeleteOperations(TestCase):
 
                 self.assertTrue(fetch.called)
 
-                data = json.loads(fetch.calls[1].kwargs["payload"])
+                data = json.loads(fetch.calls[0].kwargs["payload"])
                 self.assertEqual(1, len(data["mutations"]))
                 m0 = data["mutations"][0]
 
@@ -161,7 +161,7 @@ class TestInsertOperations(TestCase):
 
                 self.assertTrue(fetch.called)
 
-                data = json.loads(fetch.calls[1].kwargs["payload"])
+                data = json.loads(fetch.calls[0].kwargs["payload"])
                 self.assertEqual(1, len(data["mutations"]))
                 m0 = data["mutations"][0]
 
@@ -174,6 +174,20 @@ class TestInsertOperations(TestCase):
 
                 self.assertIsNotNone(cursor.lastrowid)
 
+    def test_autocommit_insert_is_single_rpc(self):
+        self.connection._pk_lookup["test"] = "id"
+
+        with sleuth.fake("pyspannerdb.fetch.fetch", return_value=FakeInsertOK()) as fetch:
+            with self.connection.cursor() as cursor:
+                cursor.execute("INSERT INTO test (id, field) VALUES (?, ?)", [1, 2])
+
+                self.assertEqual(1, fetch.call_count)
+                self.assertTrue(fetch.calls[0].args[0].endswith(":commit"))
+
+                data = json.loads(fetch.calls[0].kwargs["payload"])
+                self.assertEqual({"readWrite": {}}, data["singleUseTransaction"])
+                self.assertEqual([["1", "2"]], data["mutations"][0]["insert"]["values"])
+
 class TestSelectOperations(TestCase):
 
     def test_select_all(self):
@@ -0,0 +1,63 @@
+import json
+
+from unittest import TestCase
+
+from pyspannerdb.codec import StdlibCodec
+from pyspannerdb.errors import (
+    DatabaseError,
+    IntegrityError,
+    OperationalError,
+    ProgrammingError,
+    SessionNotFoundError,
+    error_from_response,
+)
+
+
+def google_error(code, status, message="", details=None):
+    return json.dumps({"error": {
+        "code": code, "status": status, "message": message, "details": details or []
+    }})
+
+
+class TestErrorFromResponse(TestCase):
+    def test_aborted_is_retryable_with_delay(self):
+        error = error_from_response(409, google_error(409, "ABORTED", "Transaction aborted", [{
+            "@type": "type.googleapis.com/google.rpc.RetryInfo",
+            "retryDelay": "0.250s"
+        }]))
+
+        self.assertIsInstance(error, OperationalError)
+        self.assertEqual("ABORTED", error.status)
+        self.assertEqual(409, error.code)
+        self.assertTrue(error.retryable)
+        self.assertEqual(0.25, error.retry_delay)
+
+    def test_permanent_errors(self):
+        error = error_from_response(409, google_error(409, "ALREADY_EXISTS", "Row exists"))
+        self.assertIsInstance(error, IntegrityError)
+        self.assertFalse(error.retryable)
+
+        error = error_from_response(400, google_error(400, "INVALID_ARGUMENT", "Bad SQL"))
+        self.assertIsInstance(error, ProgrammingError)
+        self.assertIn("Bad SQL", str(error))
+
+    def test_non_json_body_uses_http_status(self):
+        error = error_from_response(503, "<html>Service Unavailable</html>")
+        self.assertIsInstance(error, OperationalError)
+        self.assertEqual("UNAVAILABLE", error.status)
+        self.assertTrue(error.retryable)
+
+        error = error_from_response(418, "I'm a teapot")
+        self.assertEqual(DatabaseError, type(error))
+        self.assertFalse(error.retryable)
+
+    def test_binary_bodies(self):
+        body = google_error(404, "NOT_FOUND", "Session not found: sessions/abc").encode("utf-8")
+
+        for content in (body, bytearray(body), memoryview(body)):
+            error = error_from_response(404, content, StdlibCodec())
+            self.assertIsInstance(error, SessionNotFoundError)
+            self.assertIn("sessions/abc", str(error))
+
+        error = error_from_response(503, memoryview(b"<html>Service Unavailable</html>"))
+        self.assertIn("Service Unavailable", str(error))
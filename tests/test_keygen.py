@@ -0,0 +1,72 @@
+import threading
+
+from unittest import TestCase
+
+from pyspannerdb.keygen import (
+    KEY_BITS,
+    BitReversedSequence,
+    BlockKeyGenerator,
+    random_key,
+)
+
+
+class TestKeyGenerators(TestCase):
+    def test_random_keys_are_positive_int64s(self):
+        keys = set(random_key() for i in range(1000))
+        self.assertEqual(1000, len(keys))
+        self.assertTrue(all(0 < key < 2 ** KEY_BITS for key in keys))
+
+    def test_bit_reversed_keys_are_spread_out(self):
+        generator = BitReversedSequence(node_id=0)
+        first, second = generator(), generator()
+
+        # The lowest bit of the counter is the highest bit of the key
+        self.assertEqual(2 ** (KEY_BITS - 1), first)
+        self.assertEqual(2 ** (KEY_BITS - 2), second)
+
+    def test_bit_reversed_nodes_dont_collide(self):
+        first = BitReversedSequence(node_id=1)
+        second = BitReversedSequence(node_id=2)
+
+        keys = set(first() for i in range(1000)) | set(second() for i in range(1000))
+        self.assertEqual(2000, len(keys))
+
+    def test_block_generator_is_thread_safe(self):
+        reserved = []
+
+        def reserve(count):
+            start = len(reserved) * count
+            reserved.append(count)
+            return range(start, start + count)
+
+        generator = BlockKeyGenerator(reserve, block_size=10)
+        keys = []
+
+        def generate():
+            for i in range(100):
+                keys.append(generator())
+
+        threads = [threading.Thread(target=generate) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(400, len(set(keys)))
+        self.assertEqual(40, len(reserved))
+
+    def test_reset_after_fork(self):
+        generator = BlockKeyGenerator()
+        before = generator()
+        generator.reset()
+        self.assertNotEqual(before, generator())
+
+        sequence = BitReversedSequence()
+        node_id = sequence.node_id
+        sequence.reset()
+        self.assertNotEqual(node_id, sequence.node_id)
+
+        # Node ids which were picked explicitly are left alone
+        sequence = BitReversedSequence(node_id=1)
+        sequence.reset()
+        self.assertEqual(1, sequence.node_id)
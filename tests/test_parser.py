@@ -0,0 +1,92 @@
+import datetime
+import subprocess
+import sys
+
+from unittest import TestCase
+
+from pyspannerdb.parser import (
+    _convert_for_json,
+    count_placeholders,
+    fingerprint_sql,
+    normalize_sql,
+    replace_placeholders,
+    split_statements,
+    tables_in_query,
+)
+
+
+class TestStatementSplitting(TestCase):
+    def test_semi_colons_in_strings_and_comments(self):
+        sql = """
+            SELECT 'a;b', "c\\";d", `e;f` FROM t; -- comment; here
+            /* block; comment */ SELECT '''g ; h''' FROM t;
+            # another; comment
+        """
+        self.assertEqual([
+            """SELECT 'a;b', "c\\";d", `e;f` FROM t""",
+            "SELECT '''g ; h''' FROM t",
+        ], split_statements(sql))
+
+    def test_placeholders(self):
+        sql = "SELECT * FROM t WHERE a = ? AND b = '?' AND c = %s -- ?"
+        self.assertEqual(2, count_placeholders(sql))
+        self.assertEqual(
+            "SELECT * FROM t WHERE a = @a AND b = '?' AND c = @b -- ?",
+            replace_placeholders(sql, ["a", "b"])
+        )
+
+
+class TestNormalization(TestCase):
+    def test_whitespace_in_strings_is_kept(self):
+        self.assertEqual(
+            "SELECT * FROM t WHERE n = 'a  b'",
+            normalize_sql("SELECT  *\n  FROM t -- comment\nWHERE n = 'a  b'")
+        )
+        self.assertNotEqual(
+            normalize_sql("SELECT * FROM t WHERE n = 'a  b'"),
+            normalize_sql("SELECT * FROM t WHERE n = 'a b'")
+        )
+
+
+class TestQueryTables(TestCase):
+    def test_tables(self):
+        self.assertEqual(
+            set(["a", "b"]), tables_in_query("SELECT * FROM a JOIN `b` ON a.x = b.y WHERE z IN (1, 2)")
+        )
+        self.assertEqual(set(["a"]), tables_in_query("SELECT * FROM a WHERE x = 'FROM b'"))
+
+    def test_comma_joins_are_unknown(self):
+        self.assertEqual(set(), tables_in_query("SELECT * FROM a, b"))
+        self.assertEqual(set(), tables_in_query("SELECT * FROM a AS x, b"))
+        self.assertEqual(set(), tables_in_query("SELECT * FROM (SELECT x FROM a, b)"))
+
+
+class TestFingerprints(TestCase):
+    def test_literals_and_parameters_are_removed(self):
+        self.assertEqual(
+            "SELECT * FROM t1 WHERE id IN (?) AND name = ? AND `col 2` > ?",
+            fingerprint_sql(
+                "SELECT *  FROM t1 WHERE id IN (1, 2, 3) -- comment\n"
+                "AND name = 'x' AND `col 2` > @a"
+            )
+        )
+        self.assertEqual(
+            fingerprint_sql("INSERT INTO t (a, b) VALUES (?, ?)"),
+            fingerprint_sql("INSERT INTO t (a, b) VALUES (1, 'x'), (%s, 2.5e3)")
+        )
+
+
+class TestLazyImports(TestCase):
+    def test_import_is_cheap(self):
+        output = subprocess.check_output([
+            sys.executable, "-c",
+            "import sys, pyspannerdb; "
+            "print([m for m in ('pytz', 'uuid', 'urllib2', 'certifi', 'ssl') if m in sys.modules])"
+        ])
+        self.assertEqual("[]", output.decode("ascii").strip())
+
+    def test_aware_datetimes_are_converted_to_utc(self):
+        from pytz import timezone
+
+        value = timezone("Europe/London").localize(datetime.datetime(2017, 6, 1, 12))
+        self.assertEqual(["2017-06-01T11:00:00Z"], _convert_for_json([value]))
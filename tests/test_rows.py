@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from pyspannerdb.rows import (
+    dict_row_factory,
+    row_factory,
+    tuple_row_factory,
+)
+
+
+DESCRIPTION = [
+    ("id", "INT64", None, None, None, None, None),
+    ("colour", "STRING", None, None, None, None, None),
+]
+
+
+class TestRowFactories(TestCase):
+    def test_row_access(self):
+        make_row = row_factory(DESCRIPTION)
+        row = make_row([1, u"red"])
+
+        self.assertEqual((1, u"red"), row)
+        self.assertEqual(u"red", row[1])
+        self.assertEqual(u"red", row["colour"])
+        self.assertEqual(u"red", row.colour)
+        self.assertEqual({"id": 1, "colour": u"red"}, row.as_dict())
+        self.assertRaises(AttributeError, getattr, row, "missing")
+        self.assertFalse(hasattr(row, "__dict__"))
+
+    def test_rows_share_index(self):
+        make_row = row_factory(DESCRIPTION)
+        self.assertIs(make_row([1, u"a"])._index, make_row([2, u"b"])._index)
+
+    def test_strings_are_interned(self):
+        make_row = row_factory(DESCRIPTION)
+        first = make_row([1, u"".join([u"re", u"d"])])
+        second = make_row([2, u"".join([u"r", u"ed"])])
+        self.assertIs(first.colour, second.colour)
+
+    def test_tuple_and_dict_factories(self):
+        self.assertEqual((1, u"red"), tuple_row_factory(DESCRIPTION)([1, u"red"]))
+        self.assertEqual(
+            {"id": 1, "colour": u"red"}, dict_row_factory(DESCRIPTION)([1, u"red"])
+        )
@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+from pyspannerdb.schema import Schema, show_columns, show_index, show_tables
+
+
+DDL = [
+    """CREATE TABLE Singers (
+  SingerId INT64 NOT NULL,
+  FirstName STRING(1024),
+  Tags ARRAY<STRING(MAX)>,
+  LastUpdate TIMESTAMP NOT NULL OPTIONS (allow_commit_timestamp=true),
+) PRIMARY KEY(SingerId)""",
+    """CREATE TABLE Albums (
+  SingerId INT64 NOT NULL,
+  AlbumId INT64 NOT NULL,
+  AlbumTitle STRING(MAX),
+  CONSTRAINT FK_Singer FOREIGN KEY (SingerId) REFERENCES Singers (SingerId),
+) PRIMARY KEY(SingerId, AlbumId DESC),
+  INTERLEAVE IN PARENT Singers ON DELETE CASCADE""",
+    "CREATE UNIQUE NULL_FILTERED INDEX AlbumsByTitle ON Albums(AlbumTitle DESC) STORING (AlbumId), "
+    "INTERLEAVE IN Singers",
+    "ALTER DATABASE Music SET OPTIONS (version_retention_period = '7d')",
+]
+
+
+class TestSchema(TestCase):
+    def test_tables(self):
+        schema = Schema(DDL)
+        self.assertEqual(["Albums", "Singers"], sorted(schema.tables))
+
+        singers = schema.tables["Singers"]
+        self.assertEqual(["SingerId"], singers.primary_key)
+        self.assertEqual(
+            [("SingerId", "INT64", False), ("FirstName", "STRING(1024)", True),
+             ("Tags", "ARRAY<STRING(MAX)>", True), ("LastUpdate", "TIMESTAMP", False)],
+            [(c.name, c.spanner_type, c.nullable) for c in singers.columns]
+        )
+
+        albums = schema.tables["Albums"]
+        self.assertEqual(["SingerId", "AlbumId"], albums.primary_key)
+        self.assertEqual(3, len(albums.columns))
+        self.assertEqual("Singers", albums.parent)
+        self.assertEqual("CASCADE", albums.on_delete)
+
+    def test_indexes(self):
+        schema = Schema(DDL)
+        index = schema.indexes["AlbumsByTitle"]
+
+        self.assertEqual("Albums", index.table)
+        self.assertEqual(["AlbumTitle"], index.columns)
+        self.assertEqual(["AlbumId"], index.storing)
+        self.assertTrue(index.unique)
+        self.assertTrue(index.null_filtered)
+        self.assertEqual("Singers", index.parent)
+        self.assertEqual([index], schema.tables["Albums"].indexes)
+
+    def test_ddl_lookup(self):
+        schema = Schema(DDL)
+        self.assertEqual([DDL[2]], schema.ddl("AlbumsByTitle"))
+        self.assertEqual([], schema.ddl("Missing"))
+        self.assertEqual(DDL, schema.ddl())
+        self.assertEqual(Schema(list(DDL)).digest, schema.digest)
+
+    def test_show_statements(self):
+        schema = Schema(DDL)
+
+        self.assertEqual(
+            [["Albums", "Singers", "CASCADE"], ["Singers", None, None]],
+            show_tables(schema)["rows"]
+        )
+        self.assertEqual(
+            ["SingerId", "INT64", "NO", "1"], show_columns(schema, "Singers")["rows"][0]
+        )
+        self.assertEqual(
+            ["PRIMARY_KEY", "AlbumsByTitle"],
+            [row[1] for row in show_index(schema, "Albums")["rows"]]
+        )
+        self.assertEqual([], show_index(schema, "Missing")["rows"])
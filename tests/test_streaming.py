@@ -0,0 +1,92 @@
+import io
+import json
+import sleuth
+
+from .base import TestCase
+from pyspannerdb import streaming
+from pyspannerdb.streaming import StreamingResultSet
+
+
+class FakeStreamingResponse(io.BytesIO):
+    status_code = 200
+    headers = {}
+
+
+METADATA = {
+    "rowType": {
+        "fields": [
+            {"name": "id", "type": {"code": "INT64"}},
+            {"name": "name", "type": {"code": "STRING"}},
+        ]
+    }
+}
+
+
+def streaming_response(partial_result_sets):
+    return FakeStreamingResponse(json.dumps(partial_result_sets).encode("utf-8"))
+
+
+class TestStreamingResultSet(TestCase):
+    def test_rows_span_partial_result_sets(self):
+        response = streaming_response([
+            {"metadata": METADATA, "values": ["1", "a", "2"]},
+            {"values": ["b", "3", "c"]},
+        ])
+
+        result = StreamingResultSet(response)
+        self.assertEqual(METADATA, result.metadata)
+        self.assertEqual([["1", "a"], ["2", "b"], ["3", "c"]], list(result.rows()))
+        self.assertEqual(3, result.row_count)
+
+    def test_chunked_values_are_merged(self):
+        response = streaming_response([
+            {"metadata": METADATA, "values": ["1", "ab"], "chunkedValue": True},
+            {"values": ["cd", "2", "e"]},
+        ])
+
+        result = StreamingResultSet(response)
+        self.assertEqual([["1", "abcd"], ["2", "e"]], list(result.rows()))
+
+    def test_small_reads(self):
+        original = streaming.READ_CHUNK_SIZE
+        response = streaming_response([
+            {"metadata": METADATA, "values": ["1", u"\u00e9" * 100]},
+            {"values": ["2", "x" * 100]},
+        ])
+
+        streaming.READ_CHUNK_SIZE = 7
+        try:
+            result = StreamingResultSet(response)
+            rows = list(result.rows())
+        finally:
+            streaming.READ_CHUNK_SIZE = original
+
+        self.assertEqual([["1", u"\u00e9" * 100], ["2", "x" * 100]], rows)
+
+
+class TestStreamingCursor(TestCase):
+    def test_fetchmany_keeps_every_row(self):
+        values = []
+        for i in range(25):
+            values.extend([str(i), "row%s" % i])
+
+        def fake_fetch(url, *args, **kwargs):
+            self.assertTrue(url.endswith(":executeStreamingSql"))
+            return streaming_response([{"metadata": METADATA, "values": values}])
+
+        with sleuth.switch("pyspannerdb.fetch.fetch", fake_fetch):
+            with self.connection.cursor(stream_results=True) as cursor:
+                cursor.execute("SELECT id, name FROM test")
+                self.assertEqual(-1, cursor.rowcount)
+
+                batches = []
+                while True:
+                    batch = cursor.fetchmany(10)
+                    if not batch:
+                        break
+                    batches.append(batch)
+
+                self.assertEqual([10, 10, 5], [len(x) for x in batches])
+                self.assertEqual([0, "row0"], batches[0][0])
+                self.assertEqual([24, "row24"], batches[-1][-1])
+                self.assertEqual(25, cursor.rowcount)